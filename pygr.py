@@ -14,22 +14,36 @@ updates a declarative config (packages.conf) so you can restore with pygr apply.
 """
 
 import argparse
+import atexit
+import bisect
+import contextlib
+import errno
+import functools
 import hashlib
+import io
 import json
+import operator
 import os
 import re
+import shlex
 import shutil
 import sqlite3
 import subprocess
+import sys
 import tarfile
 import tempfile
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple
 from urllib.parse import urljoin
 
-import git  # requires GitPython
-import requests  # requires requests
-import yaml  # requires PyYAML
-from packaging import version as pkg_version  # requires packaging
+# Third-party dependencies (GitPython, requests, PyYAML, packaging) are imported where they
+# are used: together they cost ~100 ms, which pygr path, generations and --help never need
+if TYPE_CHECKING:
+    import git
+    import requests
 
 # ==================== Configuration ====================
 PYGR_ROOT = os.environ.get("PYGR_ROOT", os.path.expanduser("~/.local/share/pygr"))
@@ -38,15 +52,56 @@ PROFILE_DIR = os.path.join(PYGR_ROOT, "profiles")
 REPO_CACHE = os.path.join(PYGR_ROOT, "repos")
 DB_PATH = os.path.join(PYGR_ROOT, "pygr.db")
 SOURCE_CACHE = os.path.join(STORE_ROOT, "sources")
+MIRROR_CACHE = os.path.join(PYGR_ROOT, "mirrors")  # bare git repos, one per source repo
 CONFIG_DIR = os.path.join(PYGR_ROOT, "config")
 PACKAGES_CONF = os.path.join(CONFIG_DIR, "packages.conf")
 BACKUPS_DIR = os.path.join(PYGR_ROOT, "backups")
+RECIPE_INDEX = os.path.join(PYGR_ROOT, "recipe_index.json")
+GITHUB_CACHE = os.path.join(PYGR_ROOT, "cache", "github")  # conditional-request API cache
+APPLY_STATE = os.path.join(PYGR_ROOT, "last_apply.json")  # specs the last pygr apply installed
+
+
+def _build_jobs() -> int:
+    """PYGR_BUILD_JOBS as a positive int; unset, unparsable or < 1 means one per CPU."""
+    default = os.cpu_count() or 1
+    raw = os.environ.get("PYGR_BUILD_JOBS", "").strip()
+    if not raw:
+        return default
+    try:
+        jobs = int(raw)
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        # stderr: stdout of pygr path is eval'd by shell startup files
+        print(f"[WARNING] Ignoring PYGR_BUILD_JOBS={raw!r}; using {default}", file=sys.stderr)
+        return default
+    return jobs
+
+
+# Worker pools for Transaction.install: fetches are network-bound, builds are CPU-bound
+FETCH_WORKERS = min(32, (os.cpu_count() or 1) * 3)
+BUILD_WORKERS = _build_jobs()
+# Binary cache downloads at least this large are fetched as parallel HTTP ranges
+RANGE_DOWNLOAD_MIN = 32 << 20
+RANGE_CHUNK_SIZE = 8 << 20
+RANGE_WINDOW = 8  # chunks downloading or buffered ahead of extraction
+# Tarball regular files up to this size are written by a pool while the stream decompresses
+EXTRACT_SMALL_FILE = 1 << 20
+EXTRACT_WORKERS = 8
+# .stage-*/.tmp-* dirs untouched this long are leftovers of a killed install, not live work
+STALE_TMP_AGE = 24 * 3600
+# GitHub API: retries after a 403/429 rate-limit response, and the longest wait we accept
+GITHUB_MAX_RETRIES = 3
+GITHUB_MAX_WAIT = 60
+# Cached GitHub search results younger than this are reused without asking the API again
+GITHUB_CACHE_TTL = 300
 
 # Ensure directories exist
 os.makedirs(STORE_ROOT, exist_ok=True)
 os.makedirs(PROFILE_DIR, exist_ok=True)
 os.makedirs(REPO_CACHE, exist_ok=True)
 os.makedirs(SOURCE_CACHE, exist_ok=True)
+os.makedirs(MIRROR_CACHE, exist_ok=True)
 os.makedirs(CONFIG_DIR, exist_ok=True)
 os.makedirs(BACKUPS_DIR, exist_ok=True)
 
@@ -56,100 +111,230 @@ def logger(msg, level="INFO"):
     print(f"[{level}] {msg}")
 
 
-def run_cmd(cmd, cwd=None, env=None, check=True, capture_output=False):
-    """Run shell command and return result."""
+def run_cmd(cmd: List[str], cwd=None, env=None, check=True, capture_output=False):
+    """Run command (argv list, executed directly without a shell) and return result."""
     if capture_output:
-        result = subprocess.run(cmd, shell=True, cwd=cwd, env=env, capture_output=True, text=True)
+        result = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True)
         if check and result.returncode != 0:
             raise subprocess.CalledProcessError(result.returncode, cmd)
         return result
     else:
-        subprocess.run(cmd, shell=True, cwd=cwd, env=env, check=check)
+        subprocess.run(cmd, cwd=cwd, env=env, check=check)
 
 
 def ensure_dir(path):
     os.makedirs(path, exist_ok=True)
 
 
+def _copy_file(src, dst):
+    """shutil.copy2 via os.copy_file_range where available (in-kernel, CoW on btrfs/xfs)."""
+    if not hasattr(os, "copy_file_range"):
+        return shutil.copy2(src, dst)
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if not copied:
+                    break
+                remaining -= copied
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL):
+            raise
+        return shutil.copy2(src, dst)
+    shutil.copystat(src, dst)
+    return dst
+
+
+def _copy_tree(src, dst):
+    """Copy the contents of src into dst, cloning file extents (reflink) where the FS allows."""
+    ensure_dir(dst)
+    try:
+        run_cmd(["cp", "-a", "--reflink=auto", os.path.join(src, "."), dst], capture_output=True)
+        return
+    except (OSError, subprocess.CalledProcessError):
+        pass  # no GNU cp; copy in Python
+    shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True, copy_function=_copy_file)
+
+
+def _publish_dir(src, dest):
+    """Move directory src to dest atomically (rename; copy to a sibling first if on another FS)."""
+    try:
+        os.replace(src, dest)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(dest), prefix=".tmp-")
+    try:
+        _copy_tree(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    shutil.rmtree(src, ignore_errors=True)
+
+
+def _sweep_stale_tmp(directory: str) -> None:
+    """Delete .stage-*/.tmp-* dirs in directory that an interrupted publish left behind.
+
+    Another pygr process may be staging into a fresh one right now, so only dirs older than
+    STALE_TMP_AGE are swept.
+    """
+    cutoff = time.time() - STALE_TMP_AGE
+    try:
+        it = os.scandir(directory)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if not entry.name.startswith((".stage-", ".tmp-")):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                pass
+
+
 # ==================== Distro package manager (prefer official repo) ====================
-def _detect_distro() -> Optional[Tuple[str, str, str, str]]:
-    """Return (pm_key, install_cmd, search_cmd, remove_cmd) or None. pm_key e.g. apt, dnf, pacman, zypper, apk."""
-    os_release = "/etc/os-release"
-    if not os.path.isfile(os_release):
+Argv = Tuple[str, ...]
+
+
+def _read_os_release(path: str = "/etc/os-release") -> Optional[Dict[str, str]]:
+    """Parse os-release KEY=value lines; shlex applies the shell quoting/escaping rules it uses."""
+    try:
+        with open(path) as f:
+            text = f.read()
+    except OSError:
         return None
     env: Dict[str, str] = {}
-    with open(os_release) as f:
-        for line in f:
-            line = line.strip()
-            if "=" in line and not line.startswith("#"):
-                k, v = line.split("=", 1)
-                env[k] = v.strip('"').strip("'")
+    for line in text.splitlines():
+        try:
+            tokens = shlex.split(line, comments=True)
+        except ValueError:
+            continue  # unbalanced quotes
+        if tokens and "=" in tokens[0]:
+            k, v = tokens[0].split("=", 1)
+            env[k] = v
+    return env
+
+
+@functools.lru_cache(maxsize=1)
+def _detect_distro() -> Optional[Tuple[str, Argv, Argv, Argv]]:
+    """Return (pm_key, install_argv, search_argv, remove_argv) or None. pm_key e.g. apt, dnf, pacman, zypper, apk.
+
+    The distro cannot change while pygr runs, so this is computed once per process.
+    """
+    env = _read_os_release()
+    if env is None:
+        return None
     id_like = (env.get("ID_LIKE") or "").split()
     id_ = env.get("ID", "").lower()
     if id_ in ("debian", "ubuntu", "linuxmint", "pop") or "debian" in id_like:
-        return ("apt", "sudo apt-get install -y", "apt-cache search --names-only ^", "sudo apt-get remove -y")
+        return (
+            "apt",
+            ("sudo", "apt-get", "install", "-y"),
+            ("apt-cache", "search", "--names-only"),
+            ("sudo", "apt-get", "remove", "-y"),
+        )
     if id_ in ("fedora", "rhel", "centos", "rocky", "alma") or "fedora" in id_like or "rhel" in id_like:
-        return ("dnf", "sudo dnf install -y", "dnf list available", "sudo dnf remove -y")
+        return (
+            "dnf",
+            ("sudo", "dnf", "install", "-y"),
+            ("dnf", "list", "available"),
+            ("sudo", "dnf", "remove", "-y"),
+        )
     if id_ in ("arch", "manjaro") or "arch" in id_like:
-        return ("pacman", "sudo pacman -S --noconfirm", "pacman -Ss", "sudo pacman -R --noconfirm")
+        return (
+            "pacman",
+            ("sudo", "pacman", "-S", "--noconfirm"),
+            ("pacman", "-Ss"),
+            ("sudo", "pacman", "-R", "--noconfirm"),
+        )
     if id_ in ("opensuse-leap", "opensuse-tumbleweed", "sles") or "suse" in id_like:
-        return ("zypper", "sudo zypper install -y", "zypper search", "sudo zypper remove -y")
+        return (
+            "zypper",
+            ("sudo", "zypper", "install", "-y"),
+            ("zypper", "search"),
+            ("sudo", "zypper", "remove", "-y"),
+        )
     if id_ == "alpine":
-        return ("apk", "sudo apk add", "apk search", "sudo apk del")
+        return ("apk", ("sudo", "apk", "add"), ("apk", "search"), ("sudo", "apk", "del"))
     return None
 
 
-def distro_package_available(pm_key: str, name: str) -> bool:
-    """Check if a package is available in the distro (without installing)."""
+def _names_from_key_lines(key: str):
+    """Parser for 'Key: value' records (apt-cache show, pacman -Si)."""
+
+    def parse(stdout: str) -> Set[str]:
+        found = set()
+        for line in stdout.splitlines():
+            k, sep, v = line.partition(":")
+            if sep and k.strip() == key:
+                found.add(v.strip())
+        return found
+
+    return parse
+
+
+def _names_from_dnf_list(stdout: str) -> Set[str]:
+    # "ripgrep.x86_64   14.1.0-1.fc40   updates"
+    found = set()
+    for line in stdout.splitlines():
+        cols = line.split()
+        if len(cols) == 3 and "." in cols[0]:
+            found.add(cols[0].rsplit(".", 1)[0])
+    return found
+
+
+def _names_from_zypper_table(stdout: str) -> Set[str]:
+    # "  | htop | Interactive process viewer | package"
+    found = set()
+    for line in stdout.splitlines():
+        cells = [c.strip() for c in line.split("|")]
+        if len(cells) >= 3 and cells[1] and cells[1] != "Name":
+            found.add(cells[1])
+    return found
+
+
+_APK_PKG_RE = re.compile(r"^(.+)-\d[^-]*-r\d+$")
+
+
+def _names_from_apk_search(stdout: str) -> Set[str]:
+    # "htop-3.3.0-r0"
+    found = set()
+    for line in stdout.splitlines():
+        m = _APK_PKG_RE.match(line.strip())
+        if m:
+            found.add(m.group(1))
+    return found
+
+
+# pm_key -> (argv prefix taking any number of names, timeout, stdout -> set of names found).
+# Exit codes are ignored: most managers fail the whole call if any one name is missing.
+_DISTRO_PROBES: Dict[str, Tuple[Argv, int, Callable[[str], Set[str]]]] = {
+    "apt": (("apt-cache", "show", "--no-all-versions"), 10, _names_from_key_lines("Package")),
+    "dnf": (("dnf", "list", "available", "--quiet"), 15, _names_from_dnf_list),
+    "pacman": (("pacman", "-Si"), 10, _names_from_key_lines("Name")),
+    "zypper": (("zypper", "--quiet", "search", "--match-exact"), 15, _names_from_zypper_table),
+    "apk": (("apk", "search", "-e"), 10, _names_from_apk_search),
+}
+
+
+def distro_packages_available(pm_key: str, names: List[str]) -> Set[str]:
+    """Return the subset of names the distro has packages for, using one package manager call."""
+    probe = _DISTRO_PROBES.get(pm_key)
+    if not probe or not names:
+        return set()
+    argv, timeout, parse = probe
     try:
-        if pm_key == "apt":
-            r = subprocess.run(
-                f"apt-cache show {name}",
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-            return r.returncode == 0 and bool(r.stdout.strip())
-        if pm_key == "dnf":
-            r = subprocess.run(
-                f"dnf list available {name}",
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=15,
-            )
-            return r.returncode == 0 and name in (r.stdout or "")
-        if pm_key == "pacman":
-            r = subprocess.run(
-                f"pacman -Ss ^{name}$",
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-            return r.returncode == 0 and bool((r.stdout or "").strip())
-        if pm_key == "zypper":
-            r = subprocess.run(
-                f"zypper search -n {name}",
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=15,
-            )
-            return r.returncode == 0 and name in (r.stdout or "")
-        if pm_key == "apk":
-            r = subprocess.run(
-                f"apk search -e {name}",
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-            return r.returncode == 0 and name in (r.stdout or "")
+        r = subprocess.run(
+            [*argv, *names], capture_output=True, text=True, timeout=timeout + len(names)
+        )
     except (subprocess.TimeoutExpired, FileNotFoundError):
-        pass
-    return False
+        return set()
+    return parse(r.stdout or "") & set(names)
 
 
 def distro_install(pm_key: str, name: str) -> bool:
@@ -157,11 +342,11 @@ def distro_install(pm_key: str, name: str) -> bool:
     info = _detect_distro()
     if not info or info[0] != pm_key:
         return False
-    _pm, install_cmd, _s, _r = info
+    _pm, install_argv, _s, _r = info
     try:
-        subprocess.run(f"{install_cmd} {name}", shell=True, check=True, timeout=300)
+        subprocess.run([*install_argv, name], check=True, timeout=300)
         return True
-    except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
         return False
 
 
@@ -170,44 +355,37 @@ def distro_remove(pm_key: str, name: str) -> bool:
     info = _detect_distro()
     if not info or info[0] != pm_key:
         return False
-    _pm, _i, _s, remove_cmd = info
+    _pm, _i, _s, remove_argv = info
     try:
-        subprocess.run(f"{remove_cmd} {name}", shell=True, check=True, timeout=120)
+        subprocess.run([*remove_argv, name], check=True, timeout=120)
         return True
-    except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
         return False
 
 
-def _install_simple_name_from_github(
-    name: str, use_sandbox: bool = True, cache_url: Optional[str] = None
-) -> None:
-    """Search GitHub for name and install the first (best) result."""
-    items = github_search(name, per_page=5)
-    if not items:
-        raise SystemExit(f"No GitHub repo found for '{name}'. Try: pygr search {name}")
-    best = items[0]
-    full_name = best.get("full_name", "")
-    if "/" in full_name:
-        install_from_github(full_name, use_sandbox=use_sandbox, cache_url=cache_url)
-    else:
-        raise SystemExit(f"No GitHub repo found for '{name}'.")
-
+def distro_install_many(pm_key: str, names: List[str]) -> List[str]:
+    """Install names via distro PM in one transaction; returns the names installed.
 
-def try_install_from_distro(name: str) -> Optional[str]:
-    """
-    If current distro has a package for name, install it and return spec (e.g. distro:apt:name).
-    Otherwise return None.
+    If the combined install fails (e.g. one name is unknown), installs one at a time.
     """
     info = _detect_distro()
-    if not info:
-        return None
-    pm_key, _i, _s, _r = info
-    if not distro_package_available(pm_key, name):
-        return None
-    logger(f"Using {pm_key} package for {name} (compatible with your distribution)")
-    if distro_install(pm_key, name):
-        return f"distro:{pm_key}:{name}"
-    return None
+    if not info or info[0] != pm_key or not names:
+        return []
+    _pm, install_argv, _s, _r = info
+    try:
+        subprocess.run([*install_argv, *names], check=True, timeout=300 * len(names))
+        return list(names)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
+        if len(names) == 1:
+            return []
+    return [name for name in names if distro_install(pm_key, name)]
+
+
+def _github_best_match(name: str) -> Optional[str]:
+    """Search GitHub for name and return the first (best) result's owner/repo, or None."""
+    items = github_search(name, per_page=5)
+    full_name = items[0].get("full_name", "") if items else ""
+    return full_name if "/" in full_name else None
 
 
 # ==================== Declarative Config (pdrx-style) ====================
@@ -218,30 +396,28 @@ def try_install_from_distro(name: str) -> Optional[str]:
 # Comments and blank lines are preserved on read; comments written at head.
 
 
+_SPEC_LINE_RE = re.compile(r"(distro|github|recipe):(.*)")
+
+
 def _parse_packages_line(line: str) -> Optional[Tuple[str, str]]:
     """Return (kind:spec, display_name) or None for comment/blank."""
     line = line.strip()
-    if not line or line.startswith("#"):
+    m = _SPEC_LINE_RE.match(line)
+    if not m:
         return None
-    if line.startswith("distro:"):
+    kind, spec = m.group(1), m.group(2).strip()
+    if kind == "distro":
         # distro:apt:ripgrep -> display name ripgrep
-        parts = line[7:].strip().split(":", 1)
-        if len(parts) == 2:
-            return (line, parts[1].strip())
-        return (line, line[7:].strip())
-    if line.startswith("github:"):
-        spec = line[7:].strip()
-        if "@" in spec:
-            repo_part = spec.split("@")[0]
-        else:
-            repo_part = spec
-        name = repo_part.split("/")[-1] if "/" in repo_part else repo_part
-        return (line, name)
-    if line.startswith("recipe:"):
-        spec = line[7:].strip()
-        name = spec.split("@")[0].strip() if "@" in spec else spec.split()[0]
-        return (line, name)
-    return None
+        _pm, sep, name = spec.partition(":")
+        return (line, name.strip() if sep else spec)
+    if kind == "github":
+        return (line, spec.partition("@")[0].rsplit("/", 1)[-1])
+    name = spec.split("@")[0].strip() if "@" in spec else spec.split()[0]
+    return (line, name)
+
+
+# path -> ((mtime_ns, size), entries): instances share one parse of an unchanged file
+_config_cache: Dict[str, Tuple[Tuple[int, int], List[Tuple[str, str]]]] = {}
 
 
 class DeclarativeConfig:
@@ -249,18 +425,35 @@ class DeclarativeConfig:
 
     def __init__(self, path: str = PACKAGES_CONF):
         self.path = path
+        self._entries: List[Tuple[str, str]] = []
+        self._stamp: Optional[Tuple[int, int]] = None  # (mtime_ns, size) _entries was read at
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
 
     def read_entries(self) -> List[Tuple[str, str]]:
-        """Return list of (raw_line, display_name)."""
-        if not os.path.isfile(self.path):
+        """Return list of (raw_line, display_name). Re-parsed only when the file changed."""
+        stamp = self._stat()
+        if stamp is None:
             return []
-        entries = []
-        with open(self.path) as f:
-            for line in f:
-                parsed = _parse_packages_line(line)
-                if parsed:
-                    entries.append(parsed)
-        return entries
+        if stamp != self._stamp:
+            cached = _config_cache.get(self.path)
+            if cached and cached[0] == stamp:
+                entries = list(cached[1])
+            else:
+                entries = []
+                with open(self.path) as f:
+                    for line in f:
+                        parsed = _parse_packages_line(line)
+                        if parsed:
+                            entries.append(parsed)
+                _config_cache[self.path] = (stamp, list(entries))
+            self._entries, self._stamp = entries, stamp
+        return list(self._entries)
 
     def read_specs(self) -> List[str]:
         """Return list of spec strings (github:... or recipe:...)."""
@@ -268,20 +461,19 @@ class DeclarativeConfig:
 
     def add_entry(self, spec: str) -> None:
         """Append one line to packages.conf. spec = 'github:owner/repo@ref' or 'recipe:name@ver'."""
+        self.add_entries([spec])
+
+    def add_entries(self, specs: List[str]) -> None:
+        """Append the specs not already in packages.conf, in one write."""
         ensure_dir(os.path.dirname(self.path))
-        header = []
-        if os.path.isfile(self.path):
-            with open(self.path) as f:
-                for line in f:
-                    if line.strip().startswith("#") or not line.strip():
-                        header.append(line.rstrip("\n"))
-                    else:
-                        break
-        existing = set(self.read_specs())
-        if spec in existing:
+        entries = self.read_entries()
+        present = {e[0] for e in entries}
+        new_specs = [s for s in dict.fromkeys(specs) if s not in present]
+        if not new_specs:
             return
+        stamp = self._stat()
         with open(self.path, "a") as f:
-            if not header and os.path.isfile(self.path) and os.path.getsize(self.path) == 0:
+            if stamp is not None and stamp[1] == 0:
                 f.write(
                     "# pygr declarative packages\n"
                     "# Format: distro:pm:name | github:owner/repo@ref | recipe:name@version\n"
@@ -289,38 +481,58 @@ class DeclarativeConfig:
                     "# REMOVE: pygr remove <name>\n"
                     "# RESTORE: pygr apply\n\n"
                 )
-            f.write(spec + "\n")
+            f.write("".join(s + "\n" for s in new_specs))
+        for spec in new_specs:
+            parsed = _parse_packages_line(spec)
+            if parsed:
+                entries.append(parsed)
+        self._entries, self._stamp = entries, self._stat()
+        if self._stamp is not None:
+            _config_cache[self.path] = (self._stamp, list(entries))
 
     def remove_by_name(self, display_name: str) -> Optional[str]:
         """Remove first entry whose display name matches. Return the removed spec line or None."""
+        return self.remove_by_names([display_name]).get(display_name)
+
+    def remove_by_names(self, display_names: List[str]) -> Dict[str, str]:
+        """Remove the first entry for each display name, rewriting the file once.
+
+        Returns {display_name: removed spec line} for the names that were found.
+        """
         if not os.path.isfile(self.path):
-            return None
+            return {}
+        wanted = set(display_names)
         with open(self.path) as f:
             lines = f.readlines()
         new_lines = []
-        removed_spec = None
+        removed: Dict[str, str] = {}
         for line in lines:
             parsed = _parse_packages_line(line)
-            if parsed and parsed[1] == display_name and removed_spec is None:
-                removed_spec = parsed[0]
+            if parsed and parsed[1] in wanted and parsed[1] not in removed:
+                removed[parsed[1]] = parsed[0]
                 continue
             new_lines.append(line)
-        if removed_spec is not None:
-            with open(self.path, "w") as f:
-                f.writelines(new_lines)
-        return removed_spec
+        if removed:
+            self._replace_contents("".join(new_lines))
+        return removed
+
+    def _replace_contents(self, text: str) -> None:
+        tmp = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, self.path)
+        self._stamp = None
 
     def write_entries(self, specs: List[str]) -> None:
-        """Overwrite packages.conf with these spec lines."""
+        """Overwrite packages.conf with these spec lines (no write if it already lists exactly them)."""
+        if self._stat() is not None and self.read_specs() == list(specs):
+            return
         ensure_dir(os.path.dirname(self.path))
-        with open(self.path, "w") as f:
-            f.write(
-                "# pygr declarative packages\n"
-                "# Format: distro:pm:name | github:owner/repo@ref | recipe:name@version\n"
-                "# RESTORE: pygr apply\n\n"
-            )
-            for s in specs:
-                f.write(s + "\n")
+        self._replace_contents(
+            "# pygr declarative packages\n"
+            "# Format: distro:pm:name | github:owner/repo@ref | recipe:name@version\n"
+            "# RESTORE: pygr apply\n\n" + "".join(s + "\n" for s in specs)
+        )
 
 
 def compute_hash(data: Dict[str, Any]) -> str:
@@ -332,9 +544,35 @@ def compute_hash(data: Dict[str, Any]) -> str:
 # ==================== Database ====================
 class Database:
     def __init__(self, db_path=DB_PATH):
+        self.path = db_path
         self.conn = sqlite3.connect(db_path)
+        # WAL lets readers run alongside a writer and only needs an fsync per checkpoint
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA cache_size=-20000")  # KiB
+        self.conn.execute("PRAGMA mmap_size=268435456")
+        self._batch_depth = 0
         self._init_tables()
 
+    def _commit(self):
+        if not self._batch_depth:
+            self.conn.commit()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Commit all writes made inside the block once, at the end.
+
+        Writes are committed even if the block raises: they describe store paths that are
+        already on disk.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            self._commit()
+
     def _init_tables(self):
         c = self.conn.cursor()
         c.execute("""
@@ -347,10 +585,9 @@ class Database:
                 install_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        try:
+        columns = {row[1] for row in c.execute("PRAGMA table_info(store_packages)")}
+        if "spec" not in columns:  # databases created before the spec column
             c.execute("ALTER TABLE store_packages ADD COLUMN spec TEXT DEFAULT ''")
-        except sqlite3.OperationalError:
-            pass  # column exists
         c.execute("""
             CREATE TABLE IF NOT EXISTS repos (
                 name TEXT PRIMARY KEY,
@@ -367,30 +604,70 @@ class Database:
                 created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_profiles_name_gen ON profiles(name, generation DESC)"
+        )
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_store_name_version ON store_packages(name, version)"
+        )
         self.conn.commit()
 
     def close(self):
         self.conn.close()
 
     def add_store_package(self, store_id, name, version, store_path, spec=""):
+        self.add_store_packages([(store_id, name, version, store_path, spec)])
+
+    def add_store_packages(self, rows):
+        """Insert (id, name, version, store_path, spec) rows with one executemany and commit."""
         c = self.conn.cursor()
-        c.execute(
+        c.executemany(
             "INSERT OR REPLACE INTO store_packages (id, name, version, store_path, spec) VALUES (?,?,?,?,?)",
-            (store_id, name, version, store_path, spec),
+            rows,
         )
-        self.conn.commit()
+        self._commit()
 
     def get_store_package(self, store_id):
         c = self.conn.cursor()
         c.execute("SELECT id, name, version, store_path, COALESCE(spec,'') FROM store_packages WHERE id=?", (store_id,))
         return c.fetchone()
 
+    def _select_in(self, query, values):
+        """Run query (containing one "IN ({})") over values, in chunks below SQLite's param limit."""
+        values = list(values)
+        rows = []
+        c = self.conn.cursor()
+        for i in range(0, len(values), 500):
+            chunk = values[i : i + 500]
+            c.execute(query.format(",".join("?" * len(chunk))), chunk)
+            rows.extend(c.fetchall())
+        return rows
+
+    def get_store_packages(self, store_ids):
+        """Return {id: (id, name, version, store_path, spec)} for the given store ids (one query)."""
+        rows = self._select_in(
+            "SELECT id, name, version, store_path, COALESCE(spec,'') FROM store_packages"
+            " WHERE id IN ({})",
+            store_ids,
+        )
+        return {row[0]: row for row in rows}
+
+    def get_store_ids_by_name(self, names):
+        """Return the set of store ids whose package name is in names."""
+        rows = self._select_in("SELECT id FROM store_packages WHERE name IN ({})", names)
+        return {row[0] for row in rows}
+
+    def get_store_package_names(self, store_ids):
+        """Return the set of package names for the given store ids."""
+        rows = self._select_in("SELECT DISTINCT name FROM store_packages WHERE id IN ({})", store_ids)
+        return {row[0] for row in rows}
+
     def add_repo(self, name, url, repo_type="github"):
         c = self.conn.cursor()
         c.execute(
             "INSERT OR REPLACE INTO repos (name, url, type) VALUES (?,?,?)", (name, url, repo_type)
         )
-        self.conn.commit()
+        self._commit()
 
     def list_repos(self):
         c = self.conn.cursor()
@@ -403,7 +680,7 @@ class Database:
             "INSERT INTO profiles (name, generation, packages) VALUES (?,?,?)",
             (profile_name, generation, json.dumps(packages)),
         )
-        self.conn.commit()
+        self._commit()
 
     def get_latest_profile_generation(self, profile_name):
         c = self.conn.cursor()
@@ -428,6 +705,25 @@ class Database:
         return None
 
 
+_shared_db: Optional[Database] = None
+
+
+def get_db() -> Database:
+    """Process-wide Database for DB_PATH, opened on first use and closed at exit."""
+    global _shared_db
+    if _shared_db is None or _shared_db.path != DB_PATH:
+        if _shared_db is not None:
+            _shared_db.close()
+        _shared_db = Database(DB_PATH)
+    return _shared_db
+
+
+@atexit.register
+def _close_shared_db() -> None:
+    if _shared_db is not None:
+        _shared_db.close()
+
+
 # ==================== Recipe ====================
 class Recipe:
     def __init__(self, data: Dict[str, Any]):
@@ -444,6 +740,11 @@ class Recipe:
         assert "repo" in self.source
         assert "ref" in self.source
 
+    @functools.cached_property
+    def canonical_json(self) -> str:
+        """Canonical JSON of to_dict(), as used in derivation hashes (computed once)."""
+        return json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"))
+
     def to_dict(self):
         return {
             "name": self.name,
@@ -455,83 +756,461 @@ class Recipe:
         }
 
 
+# path -> ((mtime_ns, size), Recipe): each recipe file is parsed once per process until it changes
+_recipe_cache: Dict[str, Tuple[Tuple[int, int], Recipe]] = {}
+
+
+@functools.lru_cache(maxsize=1)
+def _yaml_loader():
+    try:
+        from yaml import CSafeLoader as loader  # libyaml-backed, much faster
+    except ImportError:
+        from yaml import SafeLoader as loader  # type: ignore[assignment]
+    return loader
+
+
 def load_recipe_file(path: str) -> Recipe:
-    with open(path) as f:
-        data = yaml.safe_load(f)
-    return Recipe(data)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _recipe_cache.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    # Hand the loader the whole file as bytes: it detects the encoding itself, and libyaml
+    # then needs no Python-level read() callbacks or text decoding
+    import yaml
+
+    with open(path, "rb") as f:
+        data = yaml.load(f.read(), Loader=_yaml_loader())  # nosec B506 - safe loader
+    recipe = Recipe(data)
+    _recipe_cache[path] = (stamp, recipe)
+    return recipe
+
+
+def _try_load_recipe_file(path: str) -> Optional[Recipe]:
+    try:
+        return load_recipe_file(path)
+    except Exception as e:
+        logger(f"Could not load {os.path.basename(path)}: {e}", "WARNING")
+        return None
+
+
+def _recipe_paths(directory: str) -> List[str]:
+    """*.yaml/*.yml files under directory, in os.walk order (scandir's d_type avoids the stats)."""
+    paths = []
+    stack = [directory]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+            elif entry.name.endswith((".yaml", ".yml")):
+                paths.append(entry.path)
+        stack.extend(reversed(subdirs))
+    return paths
 
 
 def find_recipes_in_dir(directory: str) -> List[Recipe]:
-    recipes = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith((".yaml", ".yml")):
-                try:
-                    recipes.append(load_recipe_file(os.path.join(root, file)))
-                except Exception as e:
-                    logger(f"Could not load {file}: {e}", "WARNING")
-    return recipes
+    paths = _recipe_paths(directory)
+    if len(paths) <= 1:
+        loaded = [_try_load_recipe_file(p) for p in paths]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as pool:
+            loaded = list(pool.map(_try_load_recipe_file, paths))
+    return [r for r in loaded if r is not None]
 
 
 # ==================== Source Fetcher ====================
+def _parse_ls_remote(output: str) -> Dict[str, str]:
+    """Parse `git ls-remote` output into {ref: commit}.
+
+    Each ref is also reachable by its shorter suffixes (refs/heads/main -> heads/main, main),
+    first match winning like git's own pattern matching. Annotated tags map to the commit
+    they point at.
+    """
+    refs: Dict[str, str] = {}
+    tags: Dict[str, str] = {}
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) != 2:
+            continue
+        sha, name = parts
+        if name.endswith("^{}"):
+            name = name[:-3]
+            tag_sha = tags.get(name)
+            components = name.split("/")
+            for i in range(len(components)):
+                key = "/".join(components[i:])
+                if refs.get(key) == tag_sha:
+                    refs[key] = sha
+            continue
+        tags[name] = sha
+        components = name.split("/")
+        for i in range(len(components)):
+            refs.setdefault("/".join(components[i:]), sha)
+    return refs
+
+
+def _ls_remote(repo_url: str, ref: str = "") -> Dict[str, str]:
+    """Run `git ls-remote` for repo_url (all refs, or only those matching ref)."""
+    cmd = ["git", "ls-remote", repo_url] + ([ref] if ref else [])
+    output = run_cmd(cmd, capture_output=True)
+    return _parse_ls_remote(output.stdout or "")
+
+
+_mirror_locks: Dict[str, threading.Lock] = {}
+_mirror_locks_guard = threading.Lock()
+
+
+def _ensure_mirror(repo_url: str, mirror_dir: str) -> "git.Repo":
+    """Return the bare mirror of repo_url under mirror_dir, creating it on first use."""
+    import git
+
+    name = re.sub(r"^https?://", "", repo_url).rstrip("/")
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", name[:-4] if name.endswith(".git") else name)
+    path = os.path.join(mirror_dir, name + ".git")
+    if not os.path.isdir(path):
+        ensure_dir(mirror_dir)
+        tmp = tempfile.mkdtemp(dir=mirror_dir, prefix=".tmp-")
+        try:
+            git.Repo.init(tmp, bare=True).create_remote("origin", repo_url)
+            os.replace(tmp, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return git.Repo(path)
+
+
+def _mirror_fetch(mirror: "git.Repo", commit: str) -> None:
+    """Make commit available in mirror, downloading only what it does not have yet.
+
+    Fetches just that commit with depth 1 (one round-trip, no blobs from other revisions).
+    Servers that refuse fetching by SHA get a blobless fetch of all branches instead: full
+    history, but file contents are downloaded only when a commit is exported.
+    """
+    import git
+
+    with _mirror_locks_guard:
+        lock = _mirror_locks.setdefault(mirror.git_dir, threading.Lock())
+    with lock:  # concurrent fetches into one repo collide on shallow.lock
+        try:
+            mirror.git.cat_file("-e", f"{commit}^{{commit}}")
+            return
+        except git.GitCommandError:
+            pass
+        try:
+            mirror.git.fetch("--depth=1", "--no-tags", "origin", commit)
+        except git.GitCommandError:
+            logger(f"Shallow fetch of {commit} refused, fetching all branches", "WARNING")
+            mirror.git.fetch(
+                "--filter=blob:none", "--no-tags", "origin", "+refs/heads/*:refs/heads/*"
+            )
+
+
+def _export_commit(repo_url: str, commit: str, dest: str, mirror_dir: str) -> str:
+    """Write the files of commit into the empty dir dest and return its git tree id.
+
+    Objects come from the repo's mirror (see _mirror_fetch). The checkout goes through a
+    throwaway index, so dest gets no .git dir and the mirror stays untouched. Files are
+    written by git's parallel checkout workers (one per CPU; ignored by git < 2.32).
+    """
+    mirror = _ensure_mirror(repo_url, mirror_dir)
+    _mirror_fetch(mirror, commit)
+    with tempfile.TemporaryDirectory() as index_dir:
+        run_cmd(
+            ["git", "-c", "checkout.workers=0", f"--git-dir={mirror.git_dir}"]
+            + [f"--work-tree={dest}", "checkout", "-f", commit, "--", "."],
+            env={**os.environ, "GIT_INDEX_FILE": os.path.join(index_dir, "index")},
+        )
+    return mirror.git.rev_parse(f"{commit}^{{tree}}")
+
+
+def _commit_tree_id(repo_url: str, commit: str, mirror_dir: str) -> str:
+    """git's tree id of commit, read from the repo's mirror (fetched into it if missing).
+
+    This is the same value _export_commit returns, so a cached checkout whose .treehash
+    sidecar is gone still gets the source hash a fresh fetch would.
+    """
+    mirror = _ensure_mirror(repo_url, mirror_dir)
+    _mirror_fetch(mirror, commit)
+    return mirror.git.rev_parse(f"{commit}^{{tree}}")
+
+
 class SourceFetcher:
-    def __init__(self, cache_dir):
+    def __init__(self, cache_dir, mirror_dir=None):
         self.cache_dir = cache_dir
+        self.mirror_dir = mirror_dir or MIRROR_CACHE
+        self._ref_cache: Dict[str, Dict[str, str]] = {}
+
+    def preresolve(self, recipes) -> None:
+        """List refs once per source repo (concurrently) so fetch() needs no per-recipe ls-remote."""
+        urls = {
+            f"https://github.com/{r.source['repo']}.git"
+            for r in recipes
+            if len(r.source["ref"]) != 40
+        }
+        urls -= set(self._ref_cache)
+        if not urls:
+            return
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(urls))) as pool:
+            futures = {url: pool.submit(_ls_remote, url) for url in urls}
+            for url, fut in futures.items():
+                try:
+                    self._ref_cache[url] = fut.result()
+                except subprocess.CalledProcessError as e:
+                    logger(f"Could not list refs for {url}: {e}", "WARNING")
+
+    def _resolve(self, repo_url, ref):
+        return self._ref_cache.get(repo_url, {}).get(ref) or _resolve_ref(repo_url, ref)
+
+    @staticmethod
+    def _cached_tree_hash(cache_path):
+        """Return the git tree id recorded next to cache_path, or None.
+
+        Cache dirs are keyed by commit and never modified, so the id is looked up only once.
+        """
+        try:
+            with open(cache_path + ".treehash") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
 
-    def _compute_tree_hash(self, directory):
-        hasher = hashlib.sha256()
-        for root, dirs, files in os.walk(directory):
-            dirs[:] = [d for d in dirs if d != ".git"]
-            for file in sorted(files):
-                path = os.path.join(root, file)
-                relpath = os.path.relpath(path, directory)
-                hasher.update(relpath.encode())
-                with open(path, "rb") as f:
-                    hasher.update(f.read())
-        return hasher.hexdigest()
+    @staticmethod
+    def _store_tree_hash(cache_path, tree_hash):
+        tmp = f"{cache_path}.treehash.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "w") as f:
+            f.write(tree_hash)
+        os.replace(tmp, cache_path + ".treehash")
 
     def fetch(self, recipe, force_refetch=False):
-        source = recipe.source
-        repo_url = f"https://github.com/{source['repo']}.git"
-        ref = source["ref"]
+        return self.fetch_repo(recipe.source["repo"], recipe.source["ref"], force_refetch)
+
+    def fetch_repo(self, repo, ref, force_refetch=False):
+        """Check out owner/repo at ref into the cache; return (cache_path, tree_hash)."""
+        repo_url = f"https://github.com/{repo}.git"
 
         # Get exact commit hash
-        if len(ref) == 40:
-            commit_hash = ref
-        else:
-            output = run_cmd(f"git ls-remote {repo_url} {ref}", capture_output=True)
-            commit_hash = output.stdout.split()[0] if output.stdout else None
-            if not commit_hash:
-                raise Exception(f"Could not resolve ref {ref} for {repo_url}")
+        commit_hash = ref if len(ref) == 40 else self._resolve(repo_url, ref)
 
-        cache_key = f"{source['repo'].replace('/', '_')}_{commit_hash}"
+        cache_key = f"{repo.replace('/', '_')}_{commit_hash}"
         cache_path = os.path.join(self.cache_dir, cache_key)
 
         if os.path.exists(cache_path) and not force_refetch:
             logger(f"Using cached source at {cache_path}")
-            return cache_path, self._compute_tree_hash(cache_path)
+            tree_hash = self._cached_tree_hash(cache_path)
+            if tree_hash is None:
+                # Checkouts have no .git: read the commit's tree id from the mirror instead
+                tree_hash = _commit_tree_id(repo_url, commit_hash, self.mirror_dir)
+                self._store_tree_hash(cache_path, tree_hash)
+            return cache_path, tree_hash
 
         logger(f"Fetching source from {repo_url} at commit {commit_hash}")
-        with tempfile.TemporaryDirectory() as tmpdir:
-            repo = git.Repo.clone_from(repo_url, tmpdir, depth=1, no_checkout=True)
-            repo.git.fetch("--depth=1", "origin", commit_hash)
-            repo.git.checkout(commit_hash)
-            tree_hash = self._compute_tree_hash(tmpdir)
-            shutil.copytree(tmpdir, cache_path)
-            return cache_path, tree_hash
+        # Export next to cache_path so publishing it is a rename, not a copy
+        tmpdir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            # git already hashed the tree; no need to read any file back
+            tree_hash = _export_commit(repo_url, commit_hash, tmpdir, self.mirror_dir)
+            if force_refetch and os.path.exists(cache_path):
+                shutil.rmtree(cache_path)
+            try:
+                os.replace(tmpdir, cache_path)
+            except OSError:
+                if not os.path.isdir(cache_path):
+                    raise
+                # Another fetch published the same commit first
+                shutil.rmtree(tmpdir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            raise
+        self._store_tree_hash(cache_path, tree_hash)
+        return cache_path, tree_hash
 
 
 # ==================== GitHub Search ====================
+def _pooled_session() -> "requests.Session":
+    """requests.Session whose per-host keep-alive pool fits our largest worker pool.
+
+    requests keeps 10 connections per host by default; threads beyond that open (and then
+    discard) a fresh TCP+TLS connection for every request.
+    """
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(FETCH_WORKERS, RANGE_WINDOW))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@functools.lru_cache(maxsize=1)
+def _github_session() -> "requests.Session":
+    """One keep-alive session for api.github.com, so repeated calls skip the TCP+TLS handshake."""
+    session = _pooled_session()
+    session.headers["Accept"] = "application/vnd.github.v3+json"
+    return session
+
+
+@functools.lru_cache(maxsize=1)
+def _http_session() -> "requests.Session":
+    """Keep-alive session for binary cache downloads (HEAD, GET and parallel ranges)."""
+    return _pooled_session()
+
+
+_github_reset_at = 0.0  # when an exhausted GitHub rate-limit window reopens (epoch seconds)
+
+
+def _github_wait(r: "requests.Response", backoff: float) -> Optional[float]:
+    """Seconds to wait before retrying a rate-limited response, or None to give up."""
+    if "Retry-After" in r.headers:
+        try:
+            return float(r.headers["Retry-After"])
+        except ValueError:
+            return backoff
+    if r.headers.get("X-RateLimit-Remaining") == "0":
+        return max(0.0, float(r.headers.get("X-RateLimit-Reset", 0)) - time.time()) + 1
+    # 403 without rate-limit headers is a permission error, not throttling
+    return backoff if r.status_code == 429 else None
+
+
+def _github_get(url: str, retries: int = GITHUB_MAX_RETRIES, **kwargs) -> "requests.Response":
+    """GET from the GitHub API, honouring X-RateLimit-* and Retry-After.
+
+    Waits out an exhausted window before sending, and retries 403/429 rate-limit responses with
+    exponential backoff (at most GITHUB_MAX_RETRIES times, each wait capped at GITHUB_MAX_WAIT).
+    """
+    global _github_reset_at
+    delay = _github_reset_at - time.time()
+    if 0 < delay <= GITHUB_MAX_WAIT:
+        logger(f"GitHub rate limit reached, waiting {delay:.0f}s")
+        time.sleep(delay)
+    backoff = 1.0
+    for attempt in range(retries + 1):
+        r = _github_session().get(url, **kwargs)
+        if r.headers.get("X-RateLimit-Remaining") == "0":
+            _github_reset_at = float(r.headers.get("X-RateLimit-Reset", 0)) + 1
+        if r.status_code not in (403, 429) or attempt == retries:
+            return r
+        wait_s = _github_wait(r, backoff)
+        if wait_s is None or wait_s > GITHUB_MAX_WAIT:
+            return r
+        logger(f"GitHub returned {r.status_code}, retrying in {wait_s:.0f}s", "WARNING")
+        time.sleep(wait_s)
+        backoff = min(backoff * 2, GITHUB_MAX_WAIT)
+    return r
+
+
+def _github_cache_response(url: str, entry: Dict[str, Any]) -> "requests.Response":
+    import requests
+
+    r = requests.Response()
+    r.status_code = 200
+    r.url = url
+    r.encoding = "utf-8"
+    r._content = entry["body"].encode("utf-8")
+    return r
+
+
+def _github_get_cached(url: str, ttl: float = 0, **kwargs) -> "requests.Response":
+    """_github_get through an on-disk cache of ETag/Last-Modified responses (GITHUB_CACHE).
+
+    A cached entry is revalidated with If-None-Match/If-Modified-Since; GitHub answers 304
+    without charging the rate limit and the body comes from disk. Entries younger than ttl
+    seconds are returned without any request. Entries are never shared between different
+    Authorization headers.
+    """
+    headers = dict(kwargs.pop("headers", None) or {})
+    params = kwargs.get("params") or {}
+    # Keyed by credentials too: an authenticated answer can include private repos
+    auth = hashlib.sha256(headers.get("Authorization", "").encode()).hexdigest()
+    key = "\0".join([url, json.dumps(params, sort_keys=True), headers.get("Accept", ""), auth])
+    path = os.path.join(GITHUB_CACHE, hashlib.sha1(key.encode()).hexdigest() + ".json")
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        entry = None
+    if entry and ttl and time.time() - entry.get("ts", 0) < ttl:
+        return _github_cache_response(url, entry)
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    r = _github_get(url, headers=headers, **kwargs)
+    if r.status_code == 304 and entry:
+        entry["ts"] = time.time()
+        r = _github_cache_response(url, entry)
+    elif r.status_code == 200 and (r.headers.get("ETag") or r.headers.get("Last-Modified")):
+        entry = {
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "body": r.text,
+            "ts": time.time(),
+        }
+    else:
+        return r
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        ensure_dir(GITHUB_CACHE)
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger(f"Could not write GitHub cache: {e}", "WARNING")
+    return r
+
+
+_GITHUB_REPO_URL_RE = re.compile(r"^https://github\.com/([^/]+/[^/]+?)(?:\.git)?/?$")
+
+
+def _resolve_ref_api(repo_url: str, ref: str) -> Optional[str]:
+    """Resolve ref with GET /repos/{owner}/{repo}/commits/{ref}, or None if the API can't.
+
+    The application/vnd.github.sha media type returns just the 40-char SHA: one small
+    response instead of the full ref advertisement git ls-remote downloads.
+    """
+    m = _GITHUB_REPO_URL_RE.match(repo_url)
+    if not m or _github_reset_at > time.time():
+        return None  # not on GitHub, or rate limited: ls-remote costs no API quota
+    import requests
+
+    headers = {"Accept": "application/vnd.github.sha"}
+    token = os.environ.get("GITHUB_TOKEN")
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        # No ttl: a branch can move at any time, but a 304 revalidation is free of quota
+        r = _github_get_cached(
+            f"https://api.github.com/repos/{m.group(1)}/commits/{ref}",
+            retries=0,
+            headers=headers,
+            timeout=10,
+        )
+    except requests.RequestException:
+        return None
+    sha = r.text.strip() if r.status_code == 200 else ""
+    return sha if re.fullmatch(r"[0-9a-f]{40}", sha) else None
+
+
 def github_search(query: str, per_page: int = 10) -> List[Dict[str, Any]]:
     """Search GitHub repositories. Returns list of dicts with full_name, html_url, description, etc."""
+    import requests
+
     url = "https://api.github.com/search/repositories"
     params = {"q": query, "per_page": per_page, "sort": "stars"}
-    headers = {"Accept": "application/vnd.github.v3+json"}
+    headers = {}
     token = os.environ.get("GITHUB_TOKEN")
     if token:
         headers["Authorization"] = f"Bearer {token}"
     try:
-        r = requests.get(url, params=params, headers=headers, timeout=15)
+        r = _github_get_cached(url, ttl=GITHUB_CACHE_TTL, params=params, headers=headers, timeout=15)
         r.raise_for_status()
         data = r.json()
         return data.get("items", [])
@@ -541,17 +1220,30 @@ def github_search(query: str, per_page: int = 10) -> List[Dict[str, Any]]:
 
 
 # ==================== Ad-hoc install from GitHub ====================
+@functools.lru_cache(maxsize=None)
 def _resolve_ref(repo_url: str, ref: str) -> str:
-    """Resolve branch/tag to commit hash."""
-    if len(ref) == 40 and ref.isalnum():
+    """Resolve branch/tag to commit hash (GitHub REST API, else git ls-remote).
+
+    Cached for the life of the process, so repeated specs in one apply resolve once.
+    """
+    if re.fullmatch(r"[0-9a-f]{40}", ref):
         return ref
-    out = run_cmd(f"git ls-remote {repo_url} {ref}", capture_output=True)
-    commit = (out.stdout or "").split()[0] if out.stdout else None
+    commit = _resolve_ref_api(repo_url, ref)
+    if commit:
+        return commit
+    refs = _ls_remote(repo_url, ref)
+    commit = refs.get(ref) or next(iter(refs.values()), None)
     if not commit:
         raise Exception(f"Could not resolve ref {ref} for {repo_url}")
     return commit
 
 
+def _executables(directory: str) -> List[os.DirEntry]:
+    """Regular files in directory with an executable bit set."""
+    with os.scandir(directory) as it:
+        return [e for e in it if e.is_file() and e.stat().st_mode & 0o111]
+
+
 def _adhoc_build_and_install(
     source_dir: str,
     store_path: str,
@@ -566,38 +1258,41 @@ def _adhoc_build_and_install(
     bin_dir = os.path.join(store_path, "bin")
     ensure_dir(bin_dir)
     env = os.environ.copy()
+    # Build-system markers: one readdir instead of a stat per candidate file
+    markers = {e.name for e in os.scandir(source_dir) if e.is_file()}
 
     # --- Rust ---
-    if os.path.isfile(os.path.join(source_dir, "Cargo.toml")):
-        run_cmd("cargo build --release", cwd=source_dir, env=env, check=True)
+    if "Cargo.toml" in markers:
+        run_cmd(["cargo", "build", "--release"], cwd=source_dir, env=env, check=True)
         release = os.path.join(source_dir, "target", "release")
         if os.path.isdir(release):
-            for exe in os.listdir(release):
-                p = os.path.join(release, exe)
-                if os.path.isfile(p) and os.access(p, os.X_OK):
-                    shutil.copy2(p, os.path.join(bin_dir, exe))
+            for entry in _executables(release):
+                _copy_file(entry.path, os.path.join(bin_dir, entry.name))
         return
 
     # --- Go ---
-    if os.path.isfile(os.path.join(source_dir, "go.mod")):
-        run_cmd(f"go build -o {os.path.join(bin_dir, repo_name)} .", cwd=source_dir, env=env, check=True)
+    if "go.mod" in markers:
+        run_cmd(["go", "build", "-o", os.path.join(bin_dir, repo_name), "."], cwd=source_dir, env=env, check=True)
         return
 
     # --- Node.js (before Python: some repos have both) ---
 
-    if os.path.isfile(os.path.join(source_dir, "package.json")):
-        # Node.js: npm install, copy project to store, create bin wrappers from package.json "bin"
-        run_cmd("npm install --production", cwd=source_dir, env=env, check=True)
-        # Copy full project into store_path (package root = store_path)
+    if "package.json" in markers:
+        # Node.js: copy project to store, npm install there, create bin wrappers from "bin".
+        # Dependencies are installed straight into store_path/node_modules: they are often
+        # hundreds of MB, so they are never installed in the source tree and copied over.
         for item in os.listdir(source_dir):
             src = os.path.join(source_dir, item)
             dst = os.path.join(store_path, item)
-            if item == "bin":
+            if item in ("bin", "node_modules", ".git"):
                 continue
             if os.path.isdir(src):
-                shutil.copytree(src, dst, dirs_exist_ok=True)
+                shutil.copytree(src, dst, dirs_exist_ok=True, copy_function=_copy_file)
             else:
-                shutil.copy2(src, dst)
+                _copy_file(src, dst)
+        locked = "package-lock.json" in markers or "npm-shrinkwrap.json" in markers
+        npm_cmd = ["npm", "ci"] if locked else ["npm", "install"]
+        run_cmd([*npm_cmd, "--omit=dev"], cwd=store_path, env=env, check=True)
         pkg_path = os.path.join(store_path, "package.json")
         with open(pkg_path) as f:
             pkg = json.load(f)
@@ -623,77 +1318,86 @@ def _adhoc_build_and_install(
             return
 
     # --- CMake ---
-    if os.path.isfile(os.path.join(source_dir, "CMakeLists.txt")):
+    if "CMakeLists.txt" in markers:
         build_d = os.path.join(source_dir, "build")
         ensure_dir(build_d)
-        run_cmd("cmake -DCMAKE_INSTALL_PREFIX=../install-root -DCMAKE_BUILD_TYPE=Release ..", cwd=build_d, env=env, check=True)
-        run_cmd("cmake --build . --target install", cwd=build_d, env=env, check=True)
+        run_cmd(
+            ["cmake", "-DCMAKE_INSTALL_PREFIX=../install-root", "-DCMAKE_BUILD_TYPE=Release", ".."],
+            cwd=build_d,
+            env=env,
+            check=True,
+        )
+        run_cmd(["cmake", "--build", ".", "--target", "install"], cwd=build_d, env=env, check=True)
         prefix = os.path.join(source_dir, "install-root")
         for sub in ("bin", "libexec", "lib"):
             src_bin = os.path.join(prefix, sub)
             if os.path.isdir(src_bin):
-                for exe in os.listdir(src_bin):
-                    p = os.path.join(src_bin, exe)
-                    if os.path.isfile(p) and os.access(p, os.X_OK):
-                        shutil.copy2(p, os.path.join(bin_dir, exe))
+                for entry in _executables(src_bin):
+                    _copy_file(entry.path, os.path.join(bin_dir, entry.name))
         return
 
     # --- Meson ---
-    if os.path.isfile(os.path.join(source_dir, "meson.build")):
+    if "meson.build" in markers:
         build_d = os.path.join(source_dir, "build")
         ensure_dir(build_d)
-        run_cmd("meson setup build -Dprefix=../install-root -Dbuildtype=release", cwd=source_dir, env=env, check=True)
-        run_cmd("meson compile -C build", cwd=source_dir, env=env, check=True)
-        run_cmd("meson install -C build", cwd=source_dir, env=env, check=True)
+        run_cmd(
+            ["meson", "setup", "build", "-Dprefix=../install-root", "-Dbuildtype=release"],
+            cwd=source_dir,
+            env=env,
+            check=True,
+        )
+        run_cmd(["meson", "compile", "-C", "build"], cwd=source_dir, env=env, check=True)
+        run_cmd(["meson", "install", "-C", "build"], cwd=source_dir, env=env, check=True)
         prefix = os.path.join(source_dir, "install-root")
         for sub in ("bin", "libexec"):
             src_bin = os.path.join(prefix, sub)
             if os.path.isdir(src_bin):
-                for exe in os.listdir(src_bin):
-                    p = os.path.join(src_bin, exe)
-                    if os.path.isfile(p) and os.access(p, os.X_OK):
-                        shutil.copy2(p, os.path.join(bin_dir, exe))
+                for entry in _executables(src_bin):
+                    _copy_file(entry.path, os.path.join(bin_dir, entry.name))
         return
 
     # --- Makefile ---
-    if os.path.isfile(os.path.join(source_dir, "Makefile")):
+    if "Makefile" in markers:
         prefix = os.path.join(source_dir, "install-root")
         ensure_dir(prefix)
-        run_cmd(f"make PREFIX={prefix} install", cwd=source_dir, env=env, check=True)
+        run_cmd(["make", f"PREFIX={prefix}", "install"], cwd=source_dir, env=env, check=True)
         src_bin = os.path.join(prefix, "bin")
         if os.path.isdir(src_bin):
             for exe in os.listdir(src_bin):
-                shutil.copy2(os.path.join(src_bin, exe), os.path.join(bin_dir, exe))
+                _copy_file(os.path.join(src_bin, exe), os.path.join(bin_dir, exe))
         return
 
     # --- Ruby (Gemfile) ---
-    if os.path.isfile(os.path.join(source_dir, "Gemfile")):
-        run_cmd("bundle config set --local path vendor/bundle", cwd=source_dir, env=env, check=True)
-        run_cmd("bundle install", cwd=source_dir, env=env, check=True)
+    if "Gemfile" in markers:
+        run_cmd(
+            ["bundle", "config", "set", "--local", "path", "vendor/bundle"],
+            cwd=source_dir,
+            env=env,
+            check=True,
+        )
+        run_cmd(["bundle", "install"], cwd=source_dir, env=env, check=True)
         exe_dir = os.path.join(source_dir, "exe")
         if os.path.isdir(exe_dir):
             for exe in os.listdir(exe_dir):
                 p = os.path.join(exe_dir, exe)
                 if os.path.isfile(p):
-                    shutil.copy2(p, os.path.join(bin_dir, exe))
+                    _copy_file(p, os.path.join(bin_dir, exe))
                     os.chmod(os.path.join(bin_dir, exe), 0o755)
         return
 
     # --- Gradle (Java/Kotlin) ---
-    if os.path.isfile(os.path.join(source_dir, "build.gradle")) or os.path.isfile(os.path.join(source_dir, "build.gradle.kts")):
-        run_cmd("./gradlew installDist", cwd=source_dir, env=env, check=True)
+    if "build.gradle" in markers or "build.gradle.kts" in markers:
+        run_cmd(["./gradlew", "installDist"], cwd=source_dir, env=env, check=True)
         for d in ("build/install", "build/install/main"):
             inst = os.path.join(source_dir, d, "bin")
             if os.path.isdir(inst):
-                for exe in os.listdir(inst):
-                    p = os.path.join(inst, exe)
-                    if os.path.isfile(p) and os.access(p, os.X_OK):
-                        shutil.copy2(p, os.path.join(bin_dir, exe))
+                for entry in _executables(inst):
+                    _copy_file(entry.path, os.path.join(bin_dir, entry.name))
                 return
 
     # --- Maven (Java) ---
-    if os.path.isfile(os.path.join(source_dir, "pom.xml")):
-        run_cmd("mvn -q package -DskipTests", cwd=source_dir, env=env, check=True)
+    if "pom.xml" in markers:
+        run_cmd(["mvn", "-q", "package", "-DskipTests"], cwd=source_dir, env=env, check=True)
         jar_path = None
         for root, _dirs, files in os.walk(os.path.join(source_dir, "target")):
             for f in files:
@@ -709,7 +1413,7 @@ def _adhoc_build_and_install(
         if jar_path:
             ensure_dir(os.path.join(store_path, "lib"))
             jar_name = os.path.basename(jar_path)
-            shutil.copy2(jar_path, os.path.join(store_path, "lib", jar_name))
+            _copy_file(jar_path, os.path.join(store_path, "lib", jar_name))
             wrapper = os.path.join(bin_dir, repo_name)
             with open(wrapper, "w") as w:
                 w.write("#!/bin/sh\nexec java -jar \"$(dirname \"$0\")/../lib/" + jar_name + "\" \"$@\"\n")
@@ -717,95 +1421,158 @@ def _adhoc_build_and_install(
         return
 
     # --- Just (justfile) ---
-    if os.path.isfile(os.path.join(source_dir, "justfile")) or os.path.isfile(os.path.join(source_dir, "Justfile")):
-        run_cmd("just --list", cwd=source_dir, env=env, check=True)
-        run_cmd("just build", cwd=source_dir, env=env, check=False)
+    if "justfile" in markers or "Justfile" in markers:
+        run_cmd(["just", "--list"], cwd=source_dir, env=env, check=True)
+        run_cmd(["just", "build"], cwd=source_dir, env=env, check=False)
         for sub in ("target/release", "build", "bin", "."):
             d = os.path.join(source_dir, sub)
             if os.path.isdir(d):
-                for f in os.listdir(d):
-                    p = os.path.join(d, f)
-                    if os.path.isfile(p) and os.access(p, os.X_OK) and not f.startswith("."):
-                        shutil.copy2(p, os.path.join(bin_dir, f))
+                for entry in _executables(d):
+                    if not entry.name.startswith("."):
+                        _copy_file(entry.path, os.path.join(bin_dir, entry.name))
                         return
         logger("Just build did not produce an executable in expected locations", "WARNING")
 
     # --- Python ---
-    if os.path.isfile(os.path.join(source_dir, "setup.py")) or os.path.isfile(
-        os.path.join(source_dir, "pyproject.toml")
-    ):
+    if "setup.py" in markers or "pyproject.toml" in markers:
         run_cmd(
-            f"pip install --target {os.path.join(store_path, 'lib')} .",
+            ["pip", "install", "--target", os.path.join(store_path, "lib"), "."],
             cwd=source_dir,
             env=env,
             check=True,
         )
         # Create bin wrappers if any console_scripts
-        lib = os.path.join(store_path, "lib")
-        for root, _dirs, files in os.walk(lib):
-            for f in files:
-                if f.endswith(".py") and root == os.path.join(lib, "bin"):
-                    shutil.copy2(os.path.join(root, f), os.path.join(bin_dir, f))
+        lib_bin = os.path.join(store_path, "lib", "bin")
+        if os.path.isdir(lib_bin):
+            for entry in os.scandir(lib_bin):
+                if entry.is_file() and entry.name.endswith(".py"):
+                    _copy_file(entry.path, os.path.join(bin_dir, entry.name))
         return
 
     logger("No known build system detected (Cargo, Go, Node, CMake, Meson, Make, Ruby, Gradle, Maven, Just, Python); copying executables from root", "WARNING")
     # Fallback: copy any executable in root
-    for f in os.listdir(source_dir):
-        p = os.path.join(source_dir, f)
-        if os.path.isfile(p) and os.access(p, os.X_OK) and not f.startswith("."):
-            shutil.copy2(p, os.path.join(bin_dir, f))
+    for entry in _executables(source_dir):
+        if not entry.name.startswith("."):
+            _copy_file(entry.path, os.path.join(bin_dir, entry.name))
 
 
-def install_from_github(
-    owner_repo: str,
-    ref: str = "HEAD",
-    use_sandbox: bool = True,
-    cache_url: Optional[str] = None,
-) -> str:
-    """
-    Install from GitHub owner/repo@ref (ad-hoc: clone + detect build). Returns store_id.
-    Updates store, profile, and declarative config.
-    """
+def _split_github_spec(owner_repo: str, ref: str = "HEAD") -> Tuple[str, str, str]:
+    """(owner, repo, ref) from owner/repo or owner/repo@ref (an @ref overrides ref)."""
     if "/" not in owner_repo:
         raise ValueError("Use owner/repo (e.g. BurntSushi/ripgrep)")
     owner, repo = owner_repo.split("/", 1)
     repo = repo.split("@")[0].strip()
     if "@" in owner_repo:
         ref = owner_repo.split("@")[-1].strip()
+    return owner, repo, ref
+
+
+def _build_from_github(
+    owner: str, repo: str, ref: str, use_sandbox: bool, store_root: str
+) -> Tuple[str, str, bool]:
+    """Worker: resolve, fetch and build one repo. Returns (commit, store_path, built).
+
+    Touches no database, so several can run on a thread pool.
+    """
     repo_url = f"https://github.com/{owner}/{repo}.git"
-    commit = _resolve_ref(repo_url, ref)
+    commit = _resolve_ref(repo_url, ref)  # no network for a pinned 40-hex commit
 
+    # The store path depends only on repo and commit: an installed build needs no fetch
+    store_id = hashlib.sha256(f"github:{owner}/{repo}@{commit}".encode()).hexdigest()[:16]
+    store_path = os.path.join(store_root, f"{store_id}-{repo}-{ref}")
+    if os.path.exists(store_path):
+        logger(f"Already installed: {repo}")
+        return commit, store_path, False
+
+    # Checked out next to the cache entry and renamed into place (no copytree)
     fetcher = SourceFetcher(SOURCE_CACHE)
-    cache_key = f"{owner}_{repo}_{commit}"
-    cache_path = os.path.join(SOURCE_CACHE, cache_key)
-    if not os.path.exists(cache_path):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            r = git.Repo.clone_from(repo_url, tmpdir, depth=1, no_checkout=True)
-            r.git.fetch("--depth=1", "origin", commit)
-            r.git.checkout(commit)
-            shutil.copytree(tmpdir, cache_path)
+    cache_path, _tree_hash = fetcher.fetch_repo(f"{owner}/{repo}", commit)
+    _adhoc_build_and_install(cache_path, store_path, repo, ref, use_sandbox)
+    return commit, store_path, True
 
+
+def install_many_from_github(
+    sources: List[Tuple[str, str]],
+    use_sandbox: bool = True,
+    cache_url: Optional[str] = None,
+) -> List[str]:
+    """
+    Install several GitHub repos given as (owner/repo, ref). Returns their store_ids.
+    Builds run concurrently; each store row is recorded on the calling thread as its build
+    finishes, then one new profile generation and the declarative config are written.
+    Repos that built are recorded even if another fails; the first failure (in sources
+    order) is re-raised afterwards.
+    """
+    parsed = list(dict.fromkeys(_split_github_spec(owner_repo, ref) for owner_repo, ref in sources))
+    if not parsed:
+        return []
+    errors: List[Tuple[int, Exception]] = []
+    # Resolve refs first (concurrently, memoized for the builds) and build each repo commit
+    # once: u/x and u/x@main can name one commit, one source checkout and one store id
+    unique: Dict[Tuple[str, str, str], int] = {}
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(parsed))) as pool:
+        commits = [
+            pool.submit(_resolve_ref, f"https://github.com/{owner}/{repo}.git", ref)
+            for owner, repo, ref in parsed
+        ]
+        for i, fut in enumerate(commits):
+            try:
+                unique.setdefault((parsed[i][0], parsed[i][1], fut.result()), i)
+            except Exception as e:
+                errors.append((i, e))
     store = Store()
-    store_hash = hashlib.sha256(f"github:{owner}/{repo}@{commit}".encode()).hexdigest()[:16]
-    store_id = store_hash
-    store_path = os.path.join(store.root, f"{store_id}-{repo}-{ref}")
-    if os.path.exists(store_path):
-        logger(f"Already installed: {repo}")
-    else:
-        _adhoc_build_and_install(cache_path, store_path, repo, ref, use_sandbox)
-        spec = f"github:{owner}/{repo}@{commit}"
-        store.db.add_store_package(store_id, repo, ref, store_path, spec)
+    results: Dict[int, Tuple[str, str, str]] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(BUILD_WORKERS, len(unique)))) as pool:
+        futures = {
+            pool.submit(_build_from_github, *parsed[i], use_sandbox, store.root): i
+            for i in unique.values()
+        }
+        for fut in as_completed(futures):
+            i = futures[fut]
+            owner, repo, ref = parsed[i]
+            try:
+                commit, store_path, built = fut.result()
+            except Exception as e:
+                errors.append((i, e))
+                continue
+            store_id = os.path.basename(store_path).split("-")[0]
+            spec = f"github:{owner}/{repo}@{commit}"
+            # An interrupted earlier run can leave a finished store dir without its row
+            if built or store.get_package_path(store_id) is None:
+                store.db.add_store_packages([(store_id, repo, ref, store_path, spec)])
+            results[i] = (store_id, repo, spec)
+    installed = [results[i] for i in sorted(results)]
+    errors.sort(key=lambda item: item[0])
+    for i, e in errors[1:]:  # the first failure is re-raised below
+        owner, repo, ref = parsed[i]
+        logger(f"Install of {owner}/{repo}@{ref} failed: {e}", "ERROR")
+
+    if installed:
+        profile = Profile()
+        gen, pkgs = profile.current_generation()
+        new_ids = [store_id for store_id, _, _ in installed if store_id not in pkgs]
+        if new_ids:
+            profile.add_generation(list(pkgs) + list(dict.fromkeys(new_ids)))
+        DeclarativeConfig().add_entries([spec for _, _, spec in installed])
+        for _store_id, repo, spec in installed:
+            logger(f"Installed {repo} ({spec})")
+        _print_path_hint()
+    if errors:
+        raise errors[0][1]
+    return [store_id for store_id, _, _ in installed]
 
-    profile = Profile()
-    gen, pkgs = profile.current_generation()
-    if store_id not in pkgs:
-        new_pkgs = list(pkgs) + [store_id]
-        profile.add_generation(new_pkgs)
-    spec = f"github:{owner}/{repo}@{commit}"
-    DeclarativeConfig().add_entry(spec)
-    logger(f"Installed {repo} (github:{owner}/{repo}@{commit})")
-    _print_path_hint()
-    return store_id
+
+def install_from_github(
+    owner_repo: str,
+    ref: str = "HEAD",
+    use_sandbox: bool = True,
+    cache_url: Optional[str] = None,
+) -> str:
+    """
+    Install from GitHub owner/repo@ref (ad-hoc: clone + detect build). Returns store_id.
+    Updates store, profile, and declarative config.
+    """
+    return install_many_from_github([(owner_repo, ref)], use_sandbox, cache_url)[0]
 
 
 # ==================== Store ====================
@@ -813,26 +1580,42 @@ class Store:
     def __init__(self, store_root=STORE_ROOT):
         self.root = store_root
         ensure_dir(self.root)
-        self.db = Database()
+        # Store paths and source checkouts are published by rename from these temp dirs
+        _sweep_stale_tmp(self.root)
+        _sweep_stale_tmp(SOURCE_CACHE)
+        self.db = get_db()
+        self._derivations: Dict[Tuple[str, str, Tuple[str, ...]], str] = {}
 
     def compute_derivation_hash(self, recipe, source_hash, dep_hashes):
-        data = {
-            "recipe": recipe.to_dict(),
-            "source_hash": source_hash,
-            "dependencies": sorted(dep_hashes),
-        }
-        return compute_hash(data)
+        """compute_hash of {recipe, source_hash, dependencies}, reusing the recipe's canonical JSON."""
+        deps = sorted(dep_hashes)
+        key = (recipe.canonical_json, source_hash, tuple(deps))
+        cached = self._derivations.get(key)
+        if cached is None:
+            # Same bytes compute_hash would produce for the dict (keys in sorted order), fed
+            # to the hash piece by piece instead of joined into one string first
+            h = hashlib.sha256(b'{"dependencies":')
+            h.update(json.dumps(deps, separators=(",", ":")).encode())
+            h.update(b',"recipe":')
+            h.update(recipe.canonical_json.encode())
+            h.update(b',"source_hash":')
+            h.update(json.dumps(source_hash).encode())
+            h.update(b"}")
+            cached = self._derivations[key] = h.hexdigest()
+        return cached
 
     def add_package(self, recipe, source_hash, dep_hashes, build_output_dir, spec=None):
+        """Move build_output_dir into the store (it is consumed) and register it."""
         store_hash = self.compute_derivation_hash(recipe, source_hash, dep_hashes)
         store_path = os.path.join(self.root, f"{store_hash}-{recipe.name}-{recipe.version}")
         if os.path.exists(store_path):
             logger(f"Package already exists in store: {store_path}")
+            shutil.rmtree(build_output_dir, ignore_errors=True)
             return store_path
         if spec is None:
             spec = f"recipe:{recipe.name}@{recipe.version}"
         logger(f"Installing to store: {store_path}")
-        shutil.copytree(build_output_dir, store_path)
+        _publish_dir(build_output_dir, store_path)
         self.db.add_store_package(store_hash, recipe.name, recipe.version, store_path, spec)
         return store_path
 
@@ -853,32 +1636,179 @@ class BinaryCache:
             return False
         url = urljoin(self.cache_url, f"{store_hash}.tar.gz")
         try:
-            resp = requests.get(url, stream=True, timeout=10)
-            if resp.status_code == 200:
-                logger(f"Downloading pre-built package from cache: {store_hash}")
-                with tempfile.TemporaryFile() as f:
-                    for chunk in resp.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                    f.seek(0)
-                    with tempfile.TemporaryDirectory() as tmpdir:
-                        with tarfile.open(fileobj=f, mode="r:gz") as tar:
-                            tar.extractall(path=tmpdir)
-                        items = os.listdir(tmpdir)
-                        if len(items) == 1 and os.path.isdir(os.path.join(tmpdir, items[0])):
-                            shutil.move(os.path.join(tmpdir, items[0]), store_path)
-                        else:
-                            ensure_dir(store_path)
-                            for item in items:
-                                shutil.move(
-                                    os.path.join(tmpdir, item), os.path.join(store_path, item)
-                                )
-                return True
-            else:
-                return False
+            # One GET, no HEAD: its headers tell whether parallel ranges are worth it
+            with _http_session().get(url, stream=True, timeout=10) as resp:
+                if resp.status_code != 200:
+                    return False
+                size = int(resp.headers.get("Content-Length") or 0)
+                ranged = (
+                    resp.headers.get("Accept-Ranges") == "bytes"
+                    and size >= RANGE_DOWNLOAD_MIN
+                    # Ranges address the bytes on the wire: only without a content-encoding
+                    # are those the same bytes the streamed path decodes
+                    and resp.headers.get("Content-Encoding", "identity") == "identity"
+                )
+                if not ranged:
+                    logger(f"Downloading pre-built package from cache: {store_hash}")
+                    # Extract while downloading
+                    resp.raw.decode_content = True
+                    self._extract(resp.raw, "r|gz", store_path)
+                    return True
+            logger(f"Downloading pre-built package from cache: {store_hash} ({size} bytes)")
+            # Extract from the in-order front of the range downloads, no temp file
+            self._extract(_ChunkStream(self._iter_ranges(url, size)), "r|gz", store_path)
+            return True
         except Exception as e:
             logger(f"Cache fetch failed: {e}", "WARNING")
             return False
 
+    @staticmethod
+    def _iter_ranges(url, size):
+        """Yield url's bytes in order, fetched as parallel Range requests of RANGE_CHUNK_SIZE.
+
+        At most RANGE_WINDOW chunks are in flight or buffered, so memory stays bounded however
+        slowly the consumer reads.
+        """
+
+        def get_range(start):
+            end = min(start + RANGE_CHUNK_SIZE, size) - 1
+            headers = {"Range": f"bytes={start}-{end}"}
+            with _http_session().get(url, headers=headers, stream=True, timeout=30) as resp:
+                if resp.status_code != 206:
+                    raise OSError(f"range {start}-{end} not served (HTTP {resp.status_code})")
+                blocks, remaining = [], end - start + 1
+                # Ranges address the raw bytes on the wire, so don't undo any content-encoding
+                while remaining and (block := resp.raw.read(remaining, decode_content=False)):
+                    blocks.append(block)
+                    remaining -= len(block)
+            if remaining:
+                raise OSError(f"range {start}-{end} truncated at {end + 1 - remaining}")
+            return b"".join(blocks)
+
+        starts = iter(range(0, size, RANGE_CHUNK_SIZE))
+        with ThreadPoolExecutor(max_workers=RANGE_WINDOW) as pool:
+            first = zip(range(RANGE_WINDOW), starts)  # range first: zip stops before over-reading
+            window = deque(pool.submit(get_range, start) for _, start in first)
+            while window:
+                data = window.popleft().result()
+                start = next(starts, None)
+                if start is not None:
+                    window.append(pool.submit(get_range, start))
+                yield data
+
+    @staticmethod
+    def _extract(fileobj, mode, store_path):
+        """Extract a package tarball to store_path via a sibling temp dir and a rename."""
+        tmpdir = tempfile.mkdtemp(dir=os.path.dirname(store_path), prefix=".tmp-")
+        try:
+            with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+                BinaryCache._extract_members(tar, tmpdir)
+            items = os.listdir(tmpdir)
+            if len(items) == 1 and os.path.isdir(os.path.join(tmpdir, items[0])):
+                os.replace(os.path.join(tmpdir, items[0]), store_path)
+            else:
+                os.replace(tmpdir, store_path)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    @staticmethod
+    def _extract_members(tar, dest):
+        """Extract tar into dest, writing small regular files on a thread pool.
+
+        Members are read in archive order on this thread, so streamed tarballs work. Each small
+        file's bytes go to a worker that opens, writes and closes its own path; everything else
+        is extracted in order by tarfile, after any pending write it could depend on. Directory
+        modes and mtimes are applied last, as extractall does. Every member first passes
+        _filter_member, so nothing is written outside dest.
+        """
+
+        def write(info, path, data):
+            with open(path, "wb") as f:
+                f.write(data)
+            tar.chown(info, path, False)
+            os.chmod(path, info.mode)
+            os.utime(path, (info.mtime, info.mtime))
+
+        def drain(paths):
+            for p in paths:
+                pending.pop(p).result()
+
+        dirs = []
+        pending: Dict[str, Future] = {}  # path -> its write, oldest first
+        with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+            for info in tar:
+                info = BinaryCache._filter_member(info, dest)
+                path = os.path.join(dest, info.name)
+                drain([path] if path in pending else [])  # a later member replaces this path
+                if info.isdir():
+                    os.makedirs(path, exist_ok=True)
+                    dirs.append((info, path))
+                elif info.isreg() and info.size <= EXTRACT_SMALL_FILE:
+                    data = tar.extractfile(info).read()
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    pending[path] = pool.submit(write, info, path, data)
+                    if len(pending) > 4 * EXTRACT_WORKERS:  # bound the bytes held in memory
+                        drain([next(iter(pending))])
+                else:
+                    if info.islnk():  # a hard link's target may still be being written
+                        drain(list(pending))
+                    if hasattr(tarfile, "data_filter"):
+                        tar.extract(info, dest, filter="data")
+                    else:
+                        tar.extract(info, dest)
+            drain(list(pending))
+        for info, path in reversed(dirs):
+            tar.chown(info, path, False)
+            if info.mode is not None:  # the data filter leaves directory modes alone
+                os.chmod(path, info.mode)
+            os.utime(path, (info.mtime, info.mtime))
+
+    @staticmethod
+    def _filter_member(info, dest):
+        """tarfile's "data" filter for info, or the same path checks where tarfile lacks it.
+
+        Leading slashes are stripped; names, symlinks and hard links that resolve outside dest
+        (through "..", or through a symlink extracted earlier) raise tarfile.TarError.
+        """
+        if hasattr(tarfile, "data_filter"):
+            return tarfile.data_filter(info, dest)
+        root = os.path.realpath(dest)
+
+        def inside(path):
+            return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+        info.name = info.name.lstrip("/" + os.sep)
+        target = os.path.join(dest, info.name)
+        if not inside(target):
+            raise tarfile.TarError(f"{info.name!r} would be extracted outside the store path")
+        if info.issym() and not inside(os.path.join(os.path.dirname(target), info.linkname)):
+            raise tarfile.TarError(f"{info.name!r} links outside the store path")
+        if info.islnk() and not inside(os.path.join(dest, info.linkname)):
+            raise tarfile.TarError(f"{info.name!r} links outside the store path")
+        return info
+
+
+class _ChunkStream(io.RawIOBase):
+    """Read-only file object over an iterator of bytes chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buf = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buf = memoryview(chunk)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
 
 # ==================== Builder ====================
 class Builder:
@@ -895,8 +1825,21 @@ class Builder:
                 self.use_sandbox = False
 
     def build(self, recipe, source_dir, dep_paths):
-        with tempfile.TemporaryDirectory() as build_dir:
-            shutil.copytree(source_dir, build_dir, dirs_exist_ok=True)
+        """Build recipe and return its install prefix, staged under the store root.
+
+        The prefix outlives the build dir so Store.add_package can rename it into place.
+        """
+        install_prefix = tempfile.mkdtemp(dir=self.store.root, prefix=".stage-")
+        try:
+            return self._build(recipe, source_dir, dep_paths, install_prefix)
+        except BaseException:
+            shutil.rmtree(install_prefix, ignore_errors=True)
+            raise
+
+    def _build(self, recipe, source_dir, dep_paths, install_prefix):
+        # Build on the store's filesystem so the source copy can share extents with the cache
+        with tempfile.TemporaryDirectory(dir=self.store.root, prefix=".build-") as build_dir:
+            _copy_tree(source_dir, build_dir)
 
             env = os.environ.copy()
             extra_paths = [
@@ -905,13 +1848,11 @@ class Builder:
             if extra_paths:
                 env["PATH"] = ":".join(extra_paths) + ":" + env.get("PATH", "")
 
-            install_prefix = os.path.join(build_dir, "install-root")
-            os.makedirs(install_prefix)
-
             def run_in_sandbox(cmd, cwd):
                 if self.use_sandbox and self.sandbox_cmd:
                     full_cmd = self.sandbox_cmd + [
                         f"--whitelist={build_dir}",
+                        f"--whitelist={install_prefix}",
                         "--private",
                         "--net=none",
                         "--noroot",
@@ -922,7 +1863,8 @@ class Builder:
                     ]
                     subprocess.run(full_cmd, cwd=cwd, env=env, check=True)
                 else:
-                    run_cmd(cmd, cwd=cwd, env=env, check=True)
+                    # Recipe commands are shell snippets
+                    run_cmd(["/bin/sh", "-c", cmd], cwd=cwd, env=env, check=True)
 
             # Build commands
             for cmd in recipe.build.get("commands", []):
@@ -938,13 +1880,32 @@ class Builder:
 
 
 # ==================== Version Constraint ====================
+@functools.lru_cache(maxsize=None)
+def _parse_ver(ver_str: str):
+    """packaging.version.parse, memoized: the resolver compares the same few strings repeatedly."""
+    from packaging import version as pkg_version
+
+    return pkg_version.parse(ver_str)
+
+
+_VERSION_SPEC_RE = re.compile(r"^(==|>=|<=|>|<)?\s*(.*)$")
+_VERSION_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
 class VersionConstraint:
     def __init__(self, spec: str):
         self.spec = spec.strip()
         self.op = ""
         self.version = None
+        self._target = None
         if self.spec:
-            match = re.match(r"^(==|>=|<=|>|<)?\s*(.*)$", self.spec)
+            match = _VERSION_SPEC_RE.match(self.spec)
             if match:
                 self.op = match.group(1) or "=="
                 self.version = match.group(2).strip()
@@ -956,75 +1917,139 @@ class VersionConstraint:
     def matches(self, ver_str: str) -> bool:
         if self.op == "any" or self.version is None:
             return True
-        ver = pkg_version.parse(ver_str)
-        target = pkg_version.parse(self.version)
-        if self.op == "==":
-            return ver == target
-        elif self.op == ">=":
-            return ver >= target
-        elif self.op == "<=":
-            return ver <= target
-        elif self.op == ">":
-            return ver > target
+        compare = _VERSION_OPS.get(self.op)
+        if compare is None:
+            return False
+        if self._target is None:
+            self._target = _parse_ver(self.version)  # parsed on first use, then kept
+        return compare(_parse_ver(ver_str), self._target)
+
+    def newest_index(self, versions: List[Any]) -> Optional[int]:
+        """Index of the newest match in versions (parsed, ascending), or None: O(log n)."""
+        if not versions:
+            return None
+        if self.op == "any" or self.version is None:
+            return len(versions) - 1
+        if self._target is None:
+            self._target = _parse_ver(self.version)
+        target = self._target
+        if self.op in (">=", ">"):  # the newest version satisfies these if any does
+            i = len(versions) - 1
         elif self.op == "<":
-            return ver < target
-        return False
+            i = bisect.bisect_left(versions, target) - 1
+        else:  # "==" and "<=": the last version not above target
+            i = bisect.bisect_right(versions, target) - 1
+        return i if i >= 0 and _VERSION_OPS[self.op](versions[i], target) else None
+
+
+_DEP_SPLIT_RE = re.compile(r"^\s*([^<>=\s]*)\s*(.*?)\s*$")
+
+
+@functools.lru_cache(maxsize=None)
+def _split_dep(dep: str) -> Tuple[str, str]:
+    """Split a dependency spec like 'lib>=1.0' into ('lib', '>=1.0')."""
+    m = _DEP_SPLIT_RE.match(dep)
+    return m.group(1), m.group(2)
+
+
+@functools.lru_cache(maxsize=None)
+def _version_constraint(spec: str) -> VersionConstraint:
+    """Shared VersionConstraint per spec string (constraints are never mutated)."""
+    return VersionConstraint(spec)
 
 
 # ==================== Resolver ====================
 class Resolver:
     def __init__(self, recipes_by_name: Dict[str, List[Recipe]]):
         self.recipes_by_name = recipes_by_name
+        self._resolved: Dict[Tuple[str, str], List[Recipe]] = {}
+        self._by_version: Dict[str, Tuple[List[Any], List[Recipe]]] = {}
 
     def resolve(self, root_name: str, version_spec: str = "") -> List[Recipe]:
-        self.seen: set[str] = set()
+        """Recipes needed for root_name (dependencies first). Results are memoized per spec."""
+        key = (root_name, version_spec)
+        if key not in self._resolved:
+            self._resolved[key] = self._resolve(root_name, version_spec)
+        return list(self._resolved[key])
+
+    def _resolve(self, root_name: str, version_spec: str) -> List[Recipe]:
         self.selected: Dict[str, Recipe] = {}
-        self._resolve_deps(root_name, version_spec, [])
-        # topological order
+        # Depth-first over requirements with an explicit stack (same visiting order as recursion)
+        stack: List[Tuple[str, str, Tuple[str, ...]]] = [(root_name, version_spec, ())]
+        while stack:
+            name, spec, path = stack.pop()
+            if name in path:
+                raise Exception(f"Circular dependency: {' -> '.join(path + (name,))}")
+            chosen = self.selected.get(name)
+            if chosen is not None:
+                if spec and not _version_constraint(spec).matches(chosen.version):
+                    raise Exception(
+                        f"Incompatible requirement: {name}{spec} but already selected {chosen.name}=={chosen.version}"
+                    )
+                continue
+            chosen = self._newest_matching(name, spec)
+            self.selected[name] = chosen
+            child_path = path + (name,)
+            for dep in reversed(chosen.dependencies):
+                stack.append((*_split_dep(dep), child_path))
+
+        # topological order (post-order over the selected recipes)
         order = []
         visited = set()
-
-        def visit(name):
+        todo: List[Tuple[str, bool]] = [(root_name, False)]
+        while todo:
+            name, expanded = todo.pop()
+            if expanded:
+                order.append(self.selected[name])
+                continue
             if name in visited:
-                return
+                continue
             visited.add(name)
-            recipe = self.selected[name]
-            for dep in recipe.dependencies:
-                dep_name = dep.split(">")[0].split("<")[0].split("=")[0].strip()
-                visit(dep_name)
-            order.append(recipe)
-
-        visit(root_name)
+            todo.append((name, True))
+            for dep in reversed(self.selected[name].dependencies):
+                todo.append((_split_dep(dep)[0], False))
         return order
 
-    def _resolve_deps(self, name: str, version_spec: str, path: List[str]):
-        if name in path:
-            raise Exception(f"Circular dependency: {' -> '.join(path + [name])}")
-        if name in self.selected:
-            chosen = self.selected[name]
-            if version_spec and not VersionConstraint(version_spec).matches(chosen.version):
-                raise Exception(
-                    f"Incompatible requirement: {name}{version_spec} but already selected {chosen.name}=={chosen.version}"
-                )
-            return
-
-        recipes = self.recipes_by_name.get(name, [])
+    def _candidates(self, name: str) -> Tuple[List[Any], List[Recipe]]:
+        """(parsed versions, recipes) for name, oldest first (sorted once per name).
+
+        Among recipes of equal version the first listed sorts last, so it is the one picked.
+        """
+        index = self._by_version.get(name)
+        if index is None:
+            ordered = sorted(
+                self.recipes_by_name.get(name, []), key=lambda r: _parse_ver(r.version), reverse=True
+            )[::-1]
+            index = ([_parse_ver(r.version) for r in ordered], ordered)
+            self._by_version[name] = index
+        return index
+
+    def _newest_matching(self, name: str, version_spec: str) -> Recipe:
+        versions, recipes = self._candidates(name)
         if not recipes:
             raise Exception(f"No recipe found for {name}")
-
-        constraint = VersionConstraint(version_spec)
-        candidates = [r for r in recipes if constraint.matches(r.version)]
-        if not candidates:
+        i = _version_constraint(version_spec).newest_index(versions)
+        if i is None:
             raise Exception(f"No version of {name} satisfies {version_spec}")
+        return recipes[i]
+
 
-        candidates.sort(key=lambda r: pkg_version.parse(r.version), reverse=True)
-        chosen = candidates[0]
-        self.selected[name] = chosen
+def _recipe_dir_fingerprint(directory: str) -> List[int]:
+    """[recipe file count, newest mtime_ns of recipe files and dirs] for a repo (ignores .git).
 
-        for dep in chosen.dependencies:
-            dep_name = dep.split(">")[0].split("<")[0].split("=")[0].strip()
-            dep_spec = dep[len(dep_name) :].strip()
-            self._resolve_deps(dep_name, dep_spec, path + [name])
+    Edits bump a file's mtime and additions/removals bump its directory's, so an unchanged
+    fingerprint means the cached recipes are still valid.
+    """
+    count = 0
+    newest = 0
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        newest = max(newest, os.stat(root).st_mtime_ns)
+        for file in files:
+            if file.endswith((".yaml", ".yml")):
+                count += 1
+                newest = max(newest, os.stat(os.path.join(root, file)).st_mtime_ns)
+    return [count, newest]
 
 
 # ==================== Repo Manager ====================
@@ -1033,6 +2058,8 @@ class RepoManager:
         ensure_dir(REPO_CACHE)
 
     def add_repo(self, name, url):
+        import git
+
         dest = os.path.join(REPO_CACHE, name)
         if os.path.exists(dest):
             logger(f"Repo {name} already exists, updating...")
@@ -1041,18 +2068,54 @@ class RepoManager:
         else:
             logger(f"Cloning repo {url} to {dest}")
             git.Repo.clone_from(url, dest)
-        db = Database()
-        db.add_repo(name, url)
-        db.close()
+        get_db().add_repo(name, url)
 
     def list_recipes(self) -> List[Recipe]:
+        """Recipes from all repos, re-parsing only repos whose recipe files changed."""
+        index = self._load_index()
+        fresh: Dict[str, Any] = {}
         recipes = []
         for repo_name in os.listdir(REPO_CACHE):
             repo_path = os.path.join(REPO_CACHE, repo_name)
-            if os.path.isdir(repo_path):
-                recipes.extend(find_recipes_in_dir(repo_path))
+            if not os.path.isdir(repo_path):
+                continue
+            fingerprint = _recipe_dir_fingerprint(repo_path)
+            entry = index.get(repo_path)
+            if entry and entry.get("fingerprint") == fingerprint:
+                dicts = entry["recipes"]
+                recipes.extend(Recipe(d) for d in dicts)
+            else:
+                found = find_recipes_in_dir(repo_path)
+                dicts = [r.to_dict() for r in found]
+                recipes.extend(found)
+            fresh[repo_path] = {"fingerprint": fingerprint, "recipes": dicts}
+        if fresh != index:
+            self._save_index(fresh)
         return recipes
 
+    @staticmethod
+    def _load_index() -> Dict[str, Any]:
+        try:
+            with open(RECIPE_INDEX) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    @staticmethod
+    def _save_index(index: Dict[str, Any]) -> None:
+        tmp = f"{RECIPE_INDEX}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp, RECIPE_INDEX)
+        except (OSError, TypeError, ValueError) as e:
+            # TypeError: YAML values JSON can't hold (version: 2024-01-01 loads as a date)
+            logger(f"Could not write recipe index: {e}", "WARNING")
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp)
+
     def index_recipes_by_name(self) -> Dict[str, List[Recipe]]:
         recipes = self.list_recipes()
         by_name: Dict[str, List[Recipe]] = {}
@@ -1067,7 +2130,7 @@ class Profile:
         self.name = name
         self.dir = os.path.join(PROFILE_DIR, name)
         ensure_dir(self.dir)
-        self.db = Database()
+        self.db = get_db()
 
     def current_generation(self):
         gen, pkgs = self.db.get_latest_profile_generation(self.name)
@@ -1080,29 +2143,62 @@ class Profile:
         if pkgs is None:
             raise Exception(f"Generation {generation} not found")
         bin_dir = os.path.join(self.dir, "bin")
-        ensure_dir(bin_dir)
-        # Clear bin dir (files, symlinks, and subdirs)
-        for name in os.listdir(bin_dir):
-            path = os.path.join(bin_dir, name)
-            if os.path.isdir(path):
-                shutil.rmtree(path)
-            else:
-                os.remove(path)
-        store = Store()
-        for store_id in pkgs:
-            store_path = store.get_package_path(store_id)
-            if not store_path:
-                continue
-            pkg_bin = os.path.join(store_path, "bin")
-            if os.path.isdir(pkg_bin):
-                for exe in os.listdir(pkg_bin):
-                    src = os.path.join(pkg_bin, exe)
-                    dst = os.path.join(bin_dir, exe)
-                    os.symlink(src, dst)
+        # bin is a symlink to a .bin-* dir. The new links go into a fresh .bin-* dir and bin is
+        # repointed with one rename, so PATH lookups see the old or the new set, never a
+        # half-populated or missing bin; the old dir is deleted once the new one is live
+        new_bin = tempfile.mkdtemp(dir=self.dir, prefix=".bin-")
+        try:
+            os.chmod(new_bin, 0o755)
+            rows = self.db.get_store_packages(pkgs)
+            # Create links by name relative to an open fd on new_bin: no path walk per link
+            bin_fd = (
+                os.open(new_bin, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+                if os.symlink in os.supports_dir_fd
+                else None
+            )
+            try:
+                for store_id in pkgs:
+                    row = rows.get(store_id)
+                    if not row:
+                        continue
+                    try:
+                        it = os.scandir(os.path.join(row[3], "bin"))
+                    except (FileNotFoundError, NotADirectoryError):
+                        continue
+                    with it:
+                        for entry in it:
+                            if bin_fd is None:
+                                os.symlink(entry.path, os.path.join(new_bin, entry.name))
+                            else:
+                                os.symlink(entry.path, entry.name, dir_fd=bin_fd)
+            finally:
+                if bin_fd is not None:
+                    os.close(bin_fd)
+            if os.path.isdir(bin_dir) and not os.path.islink(bin_dir):
+                # A real bin dir (older pygr) can't be replaced by a symlink: move it aside
+                os.replace(bin_dir, tempfile.mkdtemp(dir=self.dir, prefix=".old-"))
+            tmp_link = f"{bin_dir}.{os.getpid()}.tmp"
+            os.symlink(os.path.basename(new_bin), tmp_link)  # a sibling: relative is safe
+            os.replace(tmp_link, bin_dir)
+        except BaseException:
+            shutil.rmtree(new_bin, ignore_errors=True)
+            raise
+        # The new generation is live; delete every other .bin-* dir (the previous links, or
+        # one an interrupted switch populated but never linked), legacy .old-* dirs and
+        # stray temporary bin links
+        live = os.path.basename(new_bin)
+        with os.scandir(self.dir) as it:
+            for entry in it:
+                if entry.name.startswith((".bin-", ".old-")) and entry.name != live:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                elif entry.name.startswith("bin.") and entry.name.endswith(".tmp"):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(entry.path)
         current_link = os.path.join(PROFILE_DIR, self.name + "-current")
-        if os.path.exists(current_link):
-            os.remove(current_link)
-        os.symlink(os.path.join(self.dir, f"gen-{generation}"), current_link)
+        tmp_link = f"{current_link}.{os.getpid()}.tmp"
+        os.symlink(os.path.join(self.dir, f"gen-{generation}"), tmp_link)
+        os.replace(tmp_link, current_link)
         logger(f"Switched profile {self.name} to generation {generation}")
 
     def add_generation(self, store_ids):
@@ -1127,16 +2223,25 @@ class Transaction:
         self.profile = Profile(profile_name)
         self.cache = BinaryCache(cache_url)
 
+    def __enter__(self) -> "Transaction":
+        """Inside `with Transaction(...) as trans:` all database writes share one commit."""
+        self._batch = self.store.db.batch()
+        self._batch.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._batch.__exit__(*exc_info)
+
+    @functools.cached_property
+    def resolver(self) -> Resolver:
+        """Resolver over every repo recipe, indexed once however often install() runs."""
+        return Resolver(self.repo_mgr.index_recipes_by_name())
+
     def install(self, package_specs):
         # Parse specs
-        specs = []
-        for spec in package_specs:
-            name = spec.split(">")[0].split("<")[0].split("=")[0].strip()
-            constraint = spec[len(name) :].strip()
-            specs.append((name, constraint))
-
-        recipes_by_name = self.repo_mgr.index_recipes_by_name()
-        resolver = Resolver(recipes_by_name)
+        specs = [_split_dep(spec) for spec in package_specs]
+
+        resolver = self.resolver
         all_recipes = []
         seen_names = set()
         for name, constraint in specs:
@@ -1146,63 +2251,128 @@ class Transaction:
                     seen_names.add(r.name)
                     all_recipes.append(r)
 
-        built_store_ids = []
-        built_store_paths = {}
-        for recipe in all_recipes:
-            # Find dependencies already built
-            dep_ids = []
-            dep_paths = []
-            for dep_name in recipe.dependencies:
-                dep_name_clean = dep_name.split(">")[0].split("<")[0].split("=")[0].strip()
-                # find the recipe in all_recipes that matches dep_name_clean
-                dep_recipe = next((r for r in all_recipes if r.name == dep_name_clean), None)
-                if dep_recipe:
-                    idx = all_recipes.index(dep_recipe)
-                    dep_ids.append(built_store_ids[idx])
-                    dep_paths.append(built_store_paths[built_store_ids[idx]])
-
-            source_dir, source_hash = self.fetcher.fetch(recipe)
-            store_hash = self.store.compute_derivation_hash(recipe, source_hash, dep_ids)
-
-            existing_path = self.store.get_package_path(store_hash)
-            if existing_path:
-                logger(f"Package {recipe.name}-{recipe.version} already in store")
-                store_path = existing_path
-            else:
-                cache_path = os.path.join(
-                    self.store.root, store_hash + "-" + recipe.name + "-" + recipe.version
-                )
-                if self.cache.fetch(store_hash, cache_path):
-                    store_path = cache_path
-                    self.store.db.add_store_package(
-                        store_hash,
-                        recipe.name,
-                        recipe.version,
-                        store_path,
-                        f"recipe:{recipe.name}@{recipe.version}",
-                    )
-                else:
-                    logger(f"Building {recipe.name}-{recipe.version}")
-                    built_dir = self.builder.build(recipe, source_dir, dep_paths)
-                    store_path = self.store.add_package(recipe, source_hash, dep_ids, built_dir)
-
-            store_id = os.path.basename(store_path).split("-")[0]
-            built_store_ids.append(store_id)
-            built_store_paths[store_id] = store_path
+        self.fetcher.preresolve(all_recipes)
+        # Store rows and the new generation land in a single commit
+        with self.store.db.batch():
+            store_paths = self._realize_all(all_recipes)
+            built_store_ids = [os.path.basename(p).split("-")[0] for p in store_paths]
 
-        current_gen, current_pkgs = self.profile.current_generation()
-        new_pkgs = list(set(current_pkgs) | set(built_store_ids))
-        self.profile.add_generation(new_pkgs)
-        cfg = DeclarativeConfig()
-        for r in all_recipes:
-            cfg.add_entry(f"recipe:{r.name}@{r.version}")
+            current_gen, current_pkgs = self.profile.current_generation()
+            new_pkgs = list(set(current_pkgs) | set(built_store_ids))
+            self.profile.add_generation(new_pkgs)
+        DeclarativeConfig().add_entries([f"recipe:{r.name}@{r.version}" for r in all_recipes])
         logger("Installation complete. New profile generation created.")
         _print_path_hint()
 
+    def _realize_all(self, recipes: List[Recipe]) -> List[str]:
+        """Fetch and build recipes concurrently. Returns store paths in the order of recipes.
+
+        All source fetches are submitted up front so network I/O runs ahead of builds; a recipe
+        is built as soon as its source is fetched and all its dependencies are in the store.
+        Database access stays on the calling thread. Raises if any recipe was never built.
+        """
+        index = {r.name: i for i, r in enumerate(recipes)}
+        deps: List[List[int]] = []
+        dependents: List[List[int]] = [[] for _ in recipes]
+        for i, r in enumerate(recipes):
+            names = dict.fromkeys(_split_dep(d)[0] for d in r.dependencies)
+            deps.append([index[n] for n in names if n in index])
+            for d in deps[i]:
+                dependents[d].append(i)
+        blocked = [len(d) for d in deps]
+        store_ids: List[Optional[str]] = [None] * len(recipes)
+        store_paths: List[Optional[str]] = [None] * len(recipes)
+
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as fetch_pool, ThreadPoolExecutor(
+            max_workers=BUILD_WORKERS
+        ) as build_pool:
+            # Recipes pinned to the same repo and ref share one fetch (and one cache dir)
+            by_source: Dict[Tuple[str, str], Future] = {}
+            fetches = []
+            for r in recipes:
+                key = (r.source["repo"], r.source["ref"])
+                if key not in by_source:
+                    by_source[key] = fetch_pool.submit(self.fetcher.fetch, r)
+                fetches.append(by_source[key])
+
+            ready = [i for i, n in enumerate(blocked) if n == 0]
+            fetch_waiters: Dict[Future, List[int]] = {}
+            running: Dict[Future, Tuple[int, str]] = {}
+
+            def finish(i, store_id, store_path):
+                store_ids[i] = store_id
+                store_paths[i] = store_path
+                for j in dependents[i]:
+                    blocked[j] -= 1
+                    if blocked[j] == 0:
+                        ready.append(j)
+
+            while ready or fetch_waiters or running:
+                while ready:
+                    i = ready.pop()
+                    if not fetches[i].done():
+                        fetch_waiters.setdefault(fetches[i], []).append(i)
+                        continue
+                    recipe = recipes[i]
+                    source_dir, source_hash = fetches[i].result()
+                    dep_ids = [store_ids[d] for d in deps[i]]
+                    dep_paths = [store_paths[d] for d in deps[i]]
+                    store_hash = self.store.compute_derivation_hash(recipe, source_hash, dep_ids)
+                    existing_path = self.store.get_package_path(store_hash)
+                    if existing_path:
+                        logger(f"Package {recipe.name}-{recipe.version} already in store")
+                        finish(i, store_hash, existing_path)
+                        continue
+                    fut = build_pool.submit(self._realize, recipe, store_hash, source_dir, dep_paths)
+                    running[fut] = (i, source_hash)
+                if not (fetch_waiters or running):
+                    break
+
+                done, _ = wait(set(running) | set(fetch_waiters), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    if fut in fetch_waiters:
+                        ready.extend(fetch_waiters.pop(fut))
+                    if fut not in running:
+                        continue
+                    i, source_hash = running.pop(fut)
+                    recipe = recipes[i]
+                    dep_ids = [store_ids[d] for d in deps[i]]
+                    cache_path, built_dir = fut.result()
+                    if cache_path:
+                        store_hash = os.path.basename(cache_path).split("-")[0]
+                        self.store.db.add_store_package(
+                            store_hash,
+                            recipe.name,
+                            recipe.version,
+                            cache_path,
+                            f"recipe:{recipe.name}@{recipe.version}",
+                        )
+                        finish(i, store_hash, cache_path)
+                    else:
+                        store_path = self.store.add_package(recipe, source_hash, dep_ids, built_dir)
+                        finish(i, os.path.basename(store_path).split("-")[0], store_path)
+        stuck = [f"{r.name}-{r.version}" for r, p in zip(recipes, store_paths) if p is None]
+        if stuck:  # e.g. a dependency cycle: never unblocked, so never built
+            raise Exception(f"Could not schedule {', '.join(stuck)}: dependencies never finished")
+        return store_paths
+
+    def _realize(self, recipe, store_hash, source_dir, dep_paths):
+        """Worker: fetch recipe from the binary cache or build it.
+
+        Returns (cache_path, None) on a cache hit, else (None, built_dir).
+        """
+        cache_path = os.path.join(
+            self.store.root, store_hash + "-" + recipe.name + "-" + recipe.version
+        )
+        if self.cache.fetch(store_hash, cache_path):
+            return cache_path, None
+        logger(f"Building {recipe.name}-{recipe.version}")
+        return None, self.builder.build(recipe, source_dir, dep_paths)
+
     def uninstall(self, package_names):
-        cfg = DeclarativeConfig()
+        removed = DeclarativeConfig().remove_by_names(package_names)
         for name in package_names:
-            removed_spec = cfg.remove_by_name(name)
+            removed_spec = removed.get(name)
             if removed_spec and removed_spec.startswith("distro:"):
                 parts = removed_spec[7:].strip().split(":", 1)
                 if len(parts) == 2:
@@ -1210,17 +2380,7 @@ class Transaction:
                     distro_remove(pm_key, pkg_name)
                     logger(f"Removed {pkg_name} via {pm_key}")
         current_gen, current_pkgs = self.profile.current_generation()
-        store = self.store
-        to_remove = set()
-        for store_id in current_pkgs:
-            path = store.get_package_path(store_id)
-            if path:
-                base = os.path.basename(path)
-                parts = base.split("-", 2)
-                if len(parts) == 3:
-                    _, name, version = parts
-                    if name in package_names:
-                        to_remove.add(store_id)
+        to_remove = self.store.db.get_store_ids_by_name(package_names)
         new_pkgs = [p for p in current_pkgs if p not in to_remove]
         if new_pkgs != current_pkgs:
             self.profile.add_generation(new_pkgs)
@@ -1234,17 +2394,7 @@ class Transaction:
         if not package_names:
             # upgrade all
             current_gen, current_pkgs = self.profile.current_generation()
-            store = self.store
-            names = set()
-            for store_id in current_pkgs:
-                path = store.get_package_path(store_id)
-                if path:
-                    base = os.path.basename(path)
-                    parts = base.split("-", 2)
-                    if len(parts) == 3:
-                        _, name, version = parts
-                        names.add(name)
-            package_names = list(names)
+            package_names = list(self.store.db.get_store_package_names(current_pkgs))
         self.install(package_names)
 
 
@@ -1273,10 +2423,10 @@ def cmd_sync() -> None:
     distro_specs = [e[0] for e in existing if e[0].startswith("distro:")]
     profile = Profile()
     gen, store_ids = profile.current_generation()
-    store = Store()
+    rows = profile.db.get_store_packages(store_ids)
     store_specs = []
     for sid in store_ids:
-        row = store.db.get_store_package(sid)
+        row = rows.get(sid)
         if row:
             spec = row[4] if len(row) > 4 else ""
             if not spec:
@@ -1286,50 +2436,151 @@ def cmd_sync() -> None:
     logger(f"Synced generation {gen} ({len(distro_specs)} distro + {len(store_specs)} store) to {PACKAGES_CONF}")
 
 
-def cmd_apply(use_sandbox: bool = True, cache_url: Optional[str] = None) -> None:
-    """Install all packages from declarative config."""
+def cmd_install(
+    packages: List[str],
+    use_sandbox: bool = True,
+    cache_url: Optional[str] = None,
+    from_github: bool = False,
+) -> None:
+    """Install owner/repo[@ref] from GitHub, and names via distro, then recipe, then GitHub search.
+
+    Each kind is installed in one batch: a single distro PM call, one Transaction for all
+    recipe packages (built concurrently), and every GitHub repo on one build pool.
+    """
+    packages = list(dict.fromkeys(packages))  # each distinct name is installed once
+    github_sources = [(p, "HEAD") for p in packages if "/" in p.split("@")[0]]
+    simple_pkgs = [p for p in packages if "/" not in p.split("@")[0]]
+    search_pkgs: List[str] = []
+    if from_github:
+        search_pkgs = simple_pkgs
+    elif simple_pkgs:
+        distro = _detect_distro()
+        installed: List[str] = []
+        if distro:
+            pm_key = distro[0]
+            available = distro_packages_available(pm_key, simple_pkgs)
+            names = [p for p in simple_pkgs if p in available]
+            for name in names:
+                logger(f"Using {pm_key} package for {name} (compatible with your distribution)")
+            installed = distro_install_many(pm_key, names)
+            DeclarativeConfig().add_entries([f"distro:{pm_key}:{name}" for name in installed])
+        rest = [p for p in simple_pkgs if p not in installed]
+        if rest:
+            with Transaction(use_sandbox=use_sandbox, cache_url=cache_url) as trans:
+                recipe_pkgs = []
+                for p in rest:
+                    # Resolve up front (memoized) so unresolvable names go to GitHub before building
+                    try:
+                        trans.resolver.resolve(*_split_dep(p))
+                        recipe_pkgs.append(p)
+                    except Exception as e:
+                        if "No recipe found" in str(e) or "No version" in str(e):
+                            search_pkgs.append(p)
+                        else:
+                            raise
+                if recipe_pkgs:
+                    trans.install(recipe_pkgs)
+    # One failed search must not stop the other names (or the explicit repos) installing
+    unmatched = []
+    for p in search_pkgs:
+        try:
+            match = _github_best_match(p)
+        except Exception as e:
+            logger(f"GitHub search for {p} failed: {e}", "ERROR")
+            match = None
+        if match:
+            github_sources.append((match, "HEAD"))
+        else:
+            logger(f"No GitHub repo found for '{p}'. Try: pygr search {p}", "ERROR")
+            unmatched.append(p)
+    install_many_from_github(github_sources, use_sandbox=use_sandbox, cache_url=cache_url)
+    if packages:
+        _print_path_hint()
+    if unmatched:
+        raise SystemExit(f"Not installed (no GitHub repo found): {', '.join(unmatched)}")
+
+
+def _load_apply_state() -> Dict[str, Any]:
+    try:
+        with open(APPLY_STATE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def _save_apply_state(generation: int, specs: List[str]) -> None:
+    tmp = f"{APPLY_STATE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump({"generation": generation, "specs": sorted(set(specs))}, f)
+        os.replace(tmp, APPLY_STATE)
+    except OSError as e:
+        logger(f"Could not write apply state: {e}", "WARNING")
+
+
+def cmd_apply(
+    use_sandbox: bool = True, cache_url: Optional[str] = None, full: bool = False
+) -> None:
+    """Install packages from declarative config.
+
+    Store entries the previous apply installed are skipped while the profile is still at the
+    generation that apply left it on; full=True (pygr apply --full) applies every entry.
+    Distro entries are always handed to the package manager: removing a distro package
+    (through pygr or not) leaves the profile generation alone, so it can't show they are gone.
+    """
     cfg = DeclarativeConfig()
     specs = cfg.read_specs()
     if not specs:
         logger("No packages in config. Add with pygr install or edit packages.conf.")
         return
     trans = Transaction(use_sandbox=use_sandbox, cache_url=cache_url)
-    distro_specs = []
-    github_specs = []
-    recipe_specs = []
-    for s in specs:
-        if s.startswith("distro:"):
-            distro_specs.append(s)
-        elif s.startswith("github:"):
-            github_specs.append(s)
-        elif s.startswith("recipe:"):
-            recipe_specs.append(s)
-    for spec in distro_specs:
-        # distro:apt:ripgrep
-        parts = spec[7:].strip().split(":", 1)
-        if len(parts) == 2:
-            _pm, name = parts
-            if distro_install(_pm.strip(), name.strip()):
+    state = {} if full else _load_apply_state()
+    gen, _ = trans.profile.current_generation()
+    applied = set(state.get("specs", [])) if state.get("generation") == gen else set()
+    pending = [s for s in specs if s not in applied]
+    if not pending:
+        logger("Nothing to apply: all entries were applied by the last pygr apply (--full to redo).")
+        return
+    # One commit for every store row and profile generation written by this apply
+    with trans:
+        distro_specs = []
+        github_specs = []
+        recipe_specs = []
+        for s in pending:
+            if s.startswith("distro:"):
+                distro_specs.append(s)
+            elif s.startswith("github:"):
+                github_specs.append(s)
+            elif s.startswith("recipe:"):
+                recipe_specs.append(s)
+        by_pm: Dict[str, Dict[str, str]] = {}  # pm -> {name: spec}
+        for spec in distro_specs:
+            # distro:apt:ripgrep
+            parts = spec[7:].strip().split(":", 1)
+            if len(parts) == 2:
+                by_pm.setdefault(parts[0].strip(), {})[parts[1].strip()] = spec
+        for _pm, specs_by_name in by_pm.items():
+            for name in distro_install_many(_pm, list(specs_by_name)):
                 logger(f"Installed {name} via {_pm}")
-    for spec in github_specs:
-        part = spec[7:].strip()
-        if "@" in part:
-            repo_ref = part.split("@", 1)
-            owner_repo = repo_ref[0].strip()
-            ref = repo_ref[1].strip()
-            install_from_github(owner_repo, ref=ref, use_sandbox=use_sandbox, cache_url=cache_url)
-        else:
-            install_from_github(part, use_sandbox=use_sandbox, cache_url=cache_url)
-    if recipe_specs:
-        specs_for_install = []
-        for s in recipe_specs:
-            part = s[7:].strip()
-            if "@" in part:
-                name, ver = part.split("@", 1)
-                specs_for_install.append(f"{name.strip()}=={ver.strip()}")
-            else:
-                specs_for_install.append(part)
-        trans.install(specs_for_install)
+        github_sources = []
+        for spec in github_specs:
+            owner_repo, _, ref = spec[7:].strip().partition("@")
+            github_sources.append((owner_repo.strip(), ref.strip() or "HEAD"))
+        install_many_from_github(github_sources, use_sandbox=use_sandbox, cache_url=cache_url)
+        if recipe_specs:
+            specs_for_install = []
+            for s in recipe_specs:
+                part = s[7:].strip()
+                if "@" in part:
+                    name, ver = part.split("@", 1)
+                    specs_for_install.append(f"{name.strip()}=={ver.strip()}")
+                else:
+                    specs_for_install.append(part)
+            trans.install(specs_for_install)
+    # Installs append pinned specs (github:...@<commit>); they are part of what was applied
+    done = [s for s in specs + cfg.read_specs() if not s.startswith("distro:")]
+    _save_apply_state(trans.profile.current_generation()[0], done)
 
 
 def cmd_status() -> None:
@@ -1382,7 +2633,9 @@ def cmd_export(path: str = "") -> None:
     from datetime import datetime
 
     out = path or f"pygr-export-{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.tar.gz"
-    with tarfile.open(out, "w:gz") as tar:
+    # tarfile already streams each file through gzip; level 6 (gzip's own default) is far
+    # cheaper than tarfile's 9 for text configs at nearly the same size
+    with tarfile.open(out, "w:gz", compresslevel=6) as tar:
         tar.add(CONFIG_DIR, arcname="config")
     logger(f"Exported to {out}")
 
@@ -1395,7 +2648,7 @@ def cmd_import(archive: str) -> None:
 
 
 # ==================== CLI ====================
-def main():
+def _build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="pygr - Python GitHub Repository package manager (imperative + declarative)"
     )
@@ -1458,7 +2711,10 @@ def main():
 
     # sync / apply / status / backup / generations / export / import
     subparsers.add_parser("sync", help="Write current profile state to declarative config")
-    subparsers.add_parser("apply", help="Install all packages from declarative config")
+    apply_p = subparsers.add_parser("apply", help="Install all packages from declarative config")
+    apply_p.add_argument(
+        "--full", action="store_true", help="Re-apply entries the last apply already installed"
+    )
     subparsers.add_parser("status", help="Show config path, package count, backups")
     backup_p = subparsers.add_parser("backup", help="Create timestamped backup of config")
     backup_p.add_argument("label", nargs="?", default="", help="Optional backup label")
@@ -1474,23 +2730,36 @@ def main():
 
     # rollback
     subparsers.add_parser("rollback", help="Rollback to previous generation")
+    return parser
 
-    args = parser.parse_args()
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv == ["path"]:
+        # Run from shell startup files (eval $(pygr path)): skip building the full CLI
+        print(f"export PATH=\"{_profile_bin_dir()}:$PATH\"")
+        return
+    args = _build_parser().parse_args(argv)
     if getattr(args, "config_dir", None):
         _root = os.path.abspath(args.config_dir)
         os.environ["PYGR_ROOT"] = _root
         # Update module-level paths so -c takes effect
         global PYGR_ROOT, STORE_ROOT, PROFILE_DIR, REPO_CACHE, DB_PATH, SOURCE_CACHE
-        global CONFIG_DIR, PACKAGES_CONF, BACKUPS_DIR
+        global MIRROR_CACHE, CONFIG_DIR, PACKAGES_CONF, BACKUPS_DIR, RECIPE_INDEX, GITHUB_CACHE
+        global APPLY_STATE
         PYGR_ROOT = _root
         STORE_ROOT = os.path.join(PYGR_ROOT, "store")
         PROFILE_DIR = os.path.join(PYGR_ROOT, "profiles")
         REPO_CACHE = os.path.join(PYGR_ROOT, "repos")
         DB_PATH = os.path.join(PYGR_ROOT, "pygr.db")
         SOURCE_CACHE = os.path.join(STORE_ROOT, "sources")
+        MIRROR_CACHE = os.path.join(PYGR_ROOT, "mirrors")
         CONFIG_DIR = os.path.join(PYGR_ROOT, "config")
         PACKAGES_CONF = os.path.join(CONFIG_DIR, "packages.conf")
         BACKUPS_DIR = os.path.join(PYGR_ROOT, "backups")
+        RECIPE_INDEX = os.path.join(PYGR_ROOT, "recipe_index.json")
+        GITHUB_CACHE = os.path.join(PYGR_ROOT, "cache", "github")
+        APPLY_STATE = os.path.join(PYGR_ROOT, "last_apply.json")
     cache_url = args.cache or os.environ.get("PYGR_CACHE_URL")
 
     if args.command == "repo-add":
@@ -1498,9 +2767,7 @@ def main():
         mgr.add_repo(args.name, args.url)
         print(f"Repository {args.name} added.")
     elif args.command == "repo-list":
-        db = Database()
-        repos = db.list_repos()
-        db.close()
+        repos = get_db().list_repos()
         for name, url in repos:
             print(f"{name}: {url}")
     elif args.command == "search":
@@ -1514,28 +2781,12 @@ def main():
         if not items:
             print("No results. Try GITHUB_TOKEN for higher rate limit.")
     elif args.command == "install":
-        trans = Transaction(use_sandbox=args.sandbox, cache_url=cache_url)
-        github_pkgs = [p for p in args.packages if "/" in p.split("@")[0]]
-        simple_pkgs = [p for p in args.packages if p not in github_pkgs]
-        for p in github_pkgs:
-            install_from_github(p, use_sandbox=args.sandbox, cache_url=cache_url)
-        for p in simple_pkgs:
-            if args.from_github:
-                _install_simple_name_from_github(p, use_sandbox=args.sandbox, cache_url=cache_url)
-                continue
-            spec = try_install_from_distro(p)
-            if spec:
-                DeclarativeConfig().add_entry(spec)
-                continue
-            try:
-                trans.install([p])
-            except Exception as e:
-                if "No recipe found" in str(e) or "No version" in str(e):
-                    _install_simple_name_from_github(p, use_sandbox=args.sandbox, cache_url=cache_url)
-                else:
-                    raise
-        if args.packages:
-            _print_path_hint()
+        cmd_install(
+            args.packages,
+            use_sandbox=args.sandbox,
+            cache_url=cache_url,
+            from_github=args.from_github,
+        )
     elif args.command == "list":
         cfg = DeclarativeConfig()
         entries = cfg.read_entries()
@@ -1552,11 +2803,11 @@ def main():
         bin_dir = _profile_bin_dir()
         print(f"export PATH=\"{bin_dir}:$PATH\"")
     elif args.command == "uninstall":
-        trans = Transaction(use_sandbox=args.sandbox)
-        trans.uninstall(args.packages)
+        with Transaction(use_sandbox=args.sandbox) as trans:
+            trans.uninstall(args.packages)
     elif args.command == "upgrade":
-        trans = Transaction(use_sandbox=args.sandbox, cache_url=cache_url)
-        trans.upgrade(args.packages)
+        with Transaction(use_sandbox=args.sandbox, cache_url=cache_url) as trans:
+            trans.upgrade(args.packages)
     elif args.command == "rollback":
         profile = Profile()
         gen, _ = profile.current_generation()
@@ -1568,7 +2819,7 @@ def main():
     elif args.command == "sync":
         cmd_sync()
     elif args.command == "apply":
-        cmd_apply(use_sandbox=args.sandbox, cache_url=cache_url)
+        cmd_apply(use_sandbox=args.sandbox, cache_url=cache_url, full=args.full)
     elif args.command == "status":
         cmd_status()
     elif args.command == "backup":
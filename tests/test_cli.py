@@ -1,15 +1,20 @@
 """Tests for CLI (subcommands and help)."""
 
+import contextlib
+import io
 import subprocess
 import sys
 from pathlib import Path
+from types import SimpleNamespace
+
+import pygr  # noqa: E402
 
 # Run pygr as script (project root has pygr.py). PYGR_ROOT is set by conftest.
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 PYGR_SCRIPT = PROJECT_ROOT / "pygr.py"
 
 
-def _run_pygr(*args):
+def _run_script(*args):
     return subprocess.run(
         [sys.executable, str(PYGR_SCRIPT)] + list(args),
         capture_output=True,
@@ -18,6 +23,18 @@ def _run_pygr(*args):
     )
 
 
+def _run_pygr(*args):
+    """Run pygr.main in this process, returning what _run_script would (no interpreter start)."""
+    out, err = io.StringIO(), io.StringIO()
+    code = 0
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            pygr.main(list(args))
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+    return SimpleNamespace(returncode=code, stdout=out.getvalue(), stderr=err.getvalue())
+
+
 def test_cli_requires_command():
     """CLI requires a subcommand."""
     result = _run_pygr()
@@ -26,8 +43,8 @@ def test_cli_requires_command():
 
 
 def test_cli_help():
-    """pygr --help lists commands."""
-    result = _run_pygr("--help")
+    """pygr --help lists commands (run as a script, covering the __main__ entry point)."""
+    result = _run_script("--help")
     assert result.returncode == 0
     assert "pygr" in result.stdout
     assert "install" in result.stdout
@@ -53,3 +70,11 @@ def test_cli_rollback_no_previous():
     result = _run_pygr("rollback")
     assert result.returncode == 0
     assert "No previous" in result.stdout or "generation" in result.stdout.lower()
+
+
+def test_cli_path_prints_profile_bin():
+    """pygr path prints an export line for the default profile's bin dir."""
+    result = _run_pygr("path")
+    assert result.returncode == 0
+    assert result.stdout.startswith('export PATH="')
+    assert "profiles/default/bin:$PATH" in result.stdout
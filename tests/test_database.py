@@ -39,3 +39,77 @@ def test_database_profile_generations():
     pkg_list = db.get_profile_generation("default", 1)
     assert pkg_list == ["hash1", "hash2"]
     db.close()
+
+
+def test_database_batch_commits_at_end(tmp_path):
+    """Writes inside batch() become visible to other connections when the block exits."""
+    path = str(tmp_path / "batch.db")
+    db = pygr.Database(path)
+    other = pygr.Database(path)
+    with db.batch():
+        db.add_store_package("b1", "pkg", "1.0", "/store/b1-pkg-1.0")
+        db.add_store_package("b2", "pkg", "2.0", "/store/b2-pkg-2.0")
+        assert other.get_store_package("b1") is None
+    assert other.get_store_package("b2") is not None
+    db.close()
+    other.close()
+
+
+def test_database_store_lookups_by_name_and_id(tmp_path):
+    """Store ids can be looked up by package name and names by store id."""
+    db = pygr.Database(str(tmp_path / "lookup.db"))
+    db.add_store_package("id1", "foo-bar", "1.0", "/store/id1-foo-bar-1.0")
+    db.add_store_package("id2", "foo-bar", "2.0", "/store/id2-foo-bar-2.0")
+    db.add_store_package("id3", "baz", "1.0", "/store/id3-baz-1.0")
+    assert db.get_store_ids_by_name(["foo-bar"]) == {"id1", "id2"}
+    assert db.get_store_package_names(["id1", "id3", "missing"]) == {"foo-bar", "baz"}
+    assert db.get_store_package_names([]) == set()
+    db.close()
+
+
+def test_get_db_is_shared():
+    """Store and Profile share the process-wide connection."""
+    assert pygr.get_db() is pygr.get_db()
+    assert pygr.Store().db is pygr.Profile().db is pygr.get_db()
+
+
+def test_database_get_store_packages_bulk(tmp_path):
+    """get_store_packages returns rows keyed by id, skipping unknown ids."""
+    db = pygr.Database(str(tmp_path / "bulk.db"))
+    db.add_store_packages(
+        [
+            ("id1", "foo", "1.0", "/store/id1-foo-1.0", "github:u/foo@abc"),
+            ("id2", "bar", "2.0", "/store/id2-bar-2.0", ""),
+        ]
+    )
+    rows = db.get_store_packages(["id2", "id1", "nope"])
+    assert rows == {
+        "id1": ("id1", "foo", "1.0", "/store/id1-foo-1.0", "github:u/foo@abc"),
+        "id2": ("id2", "bar", "2.0", "/store/id2-bar-2.0", ""),
+    }
+    db.close()
+
+
+def test_database_connection_pragmas(tmp_path):
+    db = pygr.Database(str(tmp_path / "p.db"))
+    assert db.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.conn.execute("PRAGMA cache_size").fetchone()[0] == -20000
+    db.close()
+
+
+def test_database_adds_spec_column_to_old_schema(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE store_packages (id TEXT PRIMARY KEY, name TEXT NOT NULL, "
+        "version TEXT NOT NULL, store_path TEXT NOT NULL)"
+    )
+    conn.commit()
+    conn.close()
+    db = pygr.Database(path)
+    db.add_store_package("h1", "pkg", "1.0", "/s/h1", spec="recipe:pkg")
+    assert db.get_store_packages(["h1"])["h1"][4] == "recipe:pkg"
+    db.close()
+    pygr.Database(path).close()  # reopening must not try to add the column again
@@ -1,4 +1,6 @@
 """Tests for DeclarativeConfig and distro/github/recipe spec parsing."""
+import os
+import tarfile
 import tempfile
 from pathlib import Path
 
@@ -39,3 +41,81 @@ def test_add_and_remove_distro():
         assert cfg.read_entries() == []
     finally:
         Path(path).unlink(missing_ok=True)
+
+
+def test_remove_by_names_rewrites_once(tmp_path, monkeypatch):
+    cfg = pygr.DeclarativeConfig(str(tmp_path / "packages.conf"))
+    for spec in ("distro:apt:htop", "github:u/bat@v1", "distro:dnf:jq"):
+        cfg.add_entry(spec)
+    writes = []
+    real = cfg._replace_contents
+    monkeypatch.setattr(cfg, "_replace_contents", lambda text: writes.append(1) or real(text))
+    removed = cfg.remove_by_names(["htop", "bat", "missing"])
+    assert removed == {"htop": "distro:apt:htop", "bat": "github:u/bat@v1"}
+    assert writes == [1]
+    assert [e[1] for e in cfg.read_entries()] == ["jq"]
+
+
+def test_read_entries_parses_once_until_file_changes(tmp_path, monkeypatch):
+    """Entries are cached by (mtime, size); outside edits are picked up."""
+    import os
+
+    path = tmp_path / "packages.conf"
+    path.write_text("")
+    cfg = pygr.DeclarativeConfig(str(path))
+    cfg.add_entry("distro:apt:htop")
+    cfg.add_entry("distro:apt:jq")
+    cfg.add_entry("distro:apt:htop")
+    assert path.read_text().count("distro:apt:htop") == 1
+    assert path.read_text().startswith("# pygr declarative packages")
+
+    parses = []
+    real = pygr._parse_packages_line
+    monkeypatch.setattr(
+        pygr, "_parse_packages_line", lambda line: parses.append(line) or real(line)
+    )
+    assert cfg.read_specs() == ["distro:apt:htop", "distro:apt:jq"]
+    # a new instance (as each CLI step creates) reuses the parse too
+    assert pygr.DeclarativeConfig(str(path)).read_specs() == ["distro:apt:htop", "distro:apt:jq"]
+    assert parses == []
+
+    with open(path, "a") as f:
+        f.write("distro:apt:bat\n")
+    os.utime(path, ns=(1, 1))
+    assert cfg.read_specs()[-1] == "distro:apt:bat"
+    assert parses
+
+
+def test_parse_packages_line_kinds():
+    assert pygr._parse_packages_line("  # comment\n") is None
+    assert pygr._parse_packages_line("\n") is None
+    assert pygr._parse_packages_line("pip:foo") is None
+    assert pygr._parse_packages_line("distro:apt:ripgrep\n") == ("distro:apt:ripgrep", "ripgrep")
+    assert pygr._parse_packages_line("distro:htop") == ("distro:htop", "htop")
+    assert pygr._parse_packages_line("github:sharkdp/bat@v0.24") == ("github:sharkdp/bat@v0.24", "bat")
+    assert pygr._parse_packages_line("github:fd") == ("github:fd", "fd")
+    assert pygr._parse_packages_line("recipe:hello@1.0") == ("recipe:hello@1.0", "hello")
+    assert pygr._parse_packages_line("recipe:hello extra") == ("recipe:hello extra", "hello")
+
+
+def test_export_archives_config_dir(tmp_path):
+    pygr.DeclarativeConfig().add_entry("distro:apt:jq")
+    out = tmp_path / "export.tar.gz"
+    pygr.cmd_export(str(out))
+    with tarfile.open(out, "r:gz") as tar:
+        conf = tar.extractfile("config/" + os.path.basename(pygr.PACKAGES_CONF)).read()
+    assert b"distro:apt:jq" in conf
+
+
+def test_add_entries_and_unchanged_write_entries_skip_writes(tmp_path):
+    path = tmp_path / "packages.conf"
+    cfg = pygr.DeclarativeConfig(str(path))
+    cfg.add_entries(["distro:apt:jq", "recipe:foo@1.0", "distro:apt:jq"])
+    assert cfg.read_specs() == ["distro:apt:jq", "recipe:foo@1.0"]
+    before = path.read_text()
+    os.utime(path, ns=(1, 1))
+    cfg.add_entries(["recipe:foo@1.0"])
+    cfg.write_entries(["distro:apt:jq", "recipe:foo@1.0"])
+    assert path.stat().st_mtime_ns == 1 and path.read_text() == before
+    cfg.write_entries(["recipe:foo@1.0"])
+    assert cfg.read_specs() == ["recipe:foo@1.0"]
@@ -0,0 +1,104 @@
+"""Tests for distro package manager helpers."""
+
+import subprocess
+
+import pygr  # noqa: E402
+
+
+class _Run:
+    def __init__(self, returncode=0, stdout=""):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.calls = []
+
+    def __call__(self, argv, **kwargs):
+        self.calls.append((argv, kwargs))
+        return subprocess.CompletedProcess(argv, self.returncode, self.stdout, "")
+
+
+def test_distro_packages_available_uses_argv(monkeypatch):
+    """Availability probes run the package manager directly, without a shell."""
+    run = _Run(stdout="Package: ripgrep\n")
+    monkeypatch.setattr(pygr.subprocess, "run", run)
+    assert pygr.distro_packages_available("apt", ["ripgrep"]) == {"ripgrep"}
+    argv, kwargs = run.calls[0]
+    assert argv == ["apt-cache", "show", "--no-all-versions", "ripgrep"]
+    assert not kwargs.get("shell")
+
+
+def test_distro_packages_available_one_call_per_batch(monkeypatch):
+    """A batch probe is a single package manager call; names are parsed from its output."""
+    run = _Run(returncode=1, stdout="Name            : bat\nVersion         : 0.24\n")
+    monkeypatch.setattr(pygr.subprocess, "run", run)
+    assert pygr.distro_packages_available("pacman", ["bat", "nosuchpkg"]) == {"bat"}
+    assert [c[0] for c in run.calls] == [["pacman", "-Si", "bat", "nosuchpkg"]]
+
+
+def test_distro_packages_available_parsers(monkeypatch):
+    dnf = "Available Packages\nhtop.x86_64   3.3.0-1.fc40   updates\n"
+    monkeypatch.setattr(pygr.subprocess, "run", _Run(stdout=dnf))
+    assert pygr.distro_packages_available("dnf", ["htop", "jq"]) == {"htop"}
+    zypper = "S | Name | Summary | Type\n--+------+---------+-----\n  | htop | Viewer  | package\n"
+    monkeypatch.setattr(pygr.subprocess, "run", _Run(stdout=zypper))
+    assert pygr.distro_packages_available("zypper", ["htop"]) == {"htop"}
+    monkeypatch.setattr(pygr.subprocess, "run", _Run(stdout="py3-foo-1.2-r0\nhtop-3.3.0-r1\n"))
+    assert pygr.distro_packages_available("apk", ["htop", "py3-foo"]) == {"htop", "py3-foo"}
+
+
+def test_distro_install_many_falls_back_per_name(monkeypatch):
+    calls = []
+
+    def run(argv, check=False, **kwargs):
+        calls.append(argv)
+        if check and "bad" in argv:
+            raise subprocess.CalledProcessError(100, argv)
+        return subprocess.CompletedProcess(argv, 0, "", "")
+
+    monkeypatch.setattr(pygr.subprocess, "run", run)
+    monkeypatch.setattr(
+        pygr, "_detect_distro", lambda: ("apt", ("apt-get", "install", "-y"), (), ())
+    )
+    assert pygr.distro_install_many("apt", ["jq", "htop"]) == ["jq", "htop"]
+    assert calls == [["apt-get", "install", "-y", "jq", "htop"]]
+    calls.clear()
+    assert pygr.distro_install_many("apt", ["jq", "bad"]) == ["jq"]
+    assert calls[0] == ["apt-get", "install", "-y", "jq", "bad"]
+    assert len(calls) == 3
+
+
+def test_distro_packages_available_name_match(monkeypatch):
+    """dnf/zypper/apk probes require the name in the output."""
+    monkeypatch.setattr(pygr.subprocess, "run", _Run(stdout="Available Packages\n"))
+    assert pygr.distro_packages_available("dnf", ["htop"]) == set()
+    assert pygr.distro_packages_available("unknown-pm", ["htop"]) == set()
+
+
+def test_distro_install_appends_name_to_argv(monkeypatch):
+    run = _Run()
+    monkeypatch.setattr(pygr.subprocess, "run", run)
+    monkeypatch.setattr(
+        pygr,
+        "_detect_distro",
+        lambda: ("apk", ("sudo", "apk", "add"), ("apk", "search"), ("sudo", "apk", "del")),
+    )
+    assert pygr.distro_install("apk", "htop")
+    assert pygr.distro_remove("apk", "htop")
+    assert [c[0] for c in run.calls] == [
+        ["sudo", "apk", "add", "htop"],
+        ["sudo", "apk", "del", "htop"],
+    ]
+
+
+def test_read_os_release_quoting(tmp_path):
+    path = tmp_path / "os-release"
+    path.write_text(
+        '# comment=ignored\nNAME="Pop!_OS"\nID=pop\nID_LIKE="ubuntu debian"\n'
+        'PRETTY_NAME=\'Pop 22.04\'\nBAD="unterminated\nVERSION="22.04 \\"LTS\\""\n'
+    )
+    env = pygr._read_os_release(str(path))
+    assert env["NAME"] == "Pop!_OS"
+    assert env["ID_LIKE"] == "ubuntu debian"
+    assert env["PRETTY_NAME"] == "Pop 22.04"
+    assert env["VERSION"] == '22.04 "LTS"'
+    assert "BAD" not in env and "comment" not in env
+    assert pygr._read_os_release(str(tmp_path / "missing")) is None
@@ -0,0 +1,232 @@
+"""Tests for GitHub API helpers."""
+
+import pytest
+import requests
+
+import pygr  # noqa: E402
+
+
+class _FakeResponse:
+    def __init__(self, status_code=200, payload=None, headers=None, text=""):
+        self.status_code = status_code
+        self._payload = payload if payload is not None else {}
+        self.headers = headers or {}
+        self.text = text
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._payload
+
+
+def test_github_search_reuses_one_session(monkeypatch):
+    session = pygr._github_session()
+    assert session is pygr._github_session()
+    assert session.headers["Accept"] == "application/vnd.github.v3+json"
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append((url, kwargs))
+        return _FakeResponse(payload={"items": [{"full_name": "u/tool"}]})
+
+    monkeypatch.setattr(session, "get", get)
+    assert pygr.github_search("tool") == [{"full_name": "u/tool"}]
+    assert pygr.github_search("tool")[0]["full_name"] == "u/tool"
+    assert len(calls) == 2
+    assert calls[0][1]["params"]["q"] == "tool"
+
+
+def _serve(monkeypatch, responses):
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(url)
+        return responses.pop(0)
+
+    monkeypatch.setattr(pygr._github_session(), "get", get)
+    return calls
+
+
+def test_github_get_retries_after_retry_after(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(pygr.time, "sleep", sleeps.append)
+    monkeypatch.setattr(pygr, "_github_reset_at", 0.0)
+    calls = _serve(
+        monkeypatch,
+        [
+            _FakeResponse(429, headers={"Retry-After": "2"}),
+            _FakeResponse(403, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "0"}),
+            _FakeResponse(200, payload={"items": []}),
+        ],
+    )
+    assert pygr._github_get("https://api.github.com/x").status_code == 200
+    assert len(calls) == 3
+    assert sleeps == [2.0, 1.0]
+
+
+def test_github_get_gives_up_on_permission_error_and_long_waits(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(pygr.time, "sleep", sleeps.append)
+    monkeypatch.setattr(pygr, "_github_reset_at", 0.0)
+    _serve(monkeypatch, [_FakeResponse(403)])
+    assert pygr._github_get("https://api.github.com/x").status_code == 403
+    _serve(monkeypatch, [_FakeResponse(429, headers={"Retry-After": "3600"})])
+    assert pygr._github_get("https://api.github.com/x").status_code == 429
+    assert sleeps == []
+
+
+def test_github_get_waits_for_exhausted_window(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(pygr.time, "sleep", sleeps.append)
+    monkeypatch.setattr(pygr.time, "time", lambda: 1000.0)
+    monkeypatch.setattr(pygr, "_github_reset_at", 0.0)
+    headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1010"}
+    _serve(monkeypatch, [_FakeResponse(200, headers=headers), _FakeResponse(200)])
+    pygr._github_get("https://api.github.com/x")
+    assert sleeps == []
+    pygr._github_get("https://api.github.com/x")
+    assert sleeps == [11.0]
+
+
+def test_resolve_ref_uses_commits_api(monkeypatch):
+    pygr._resolve_ref.cache_clear()
+    monkeypatch.setattr(pygr, "_github_reset_at", 0.0)
+    calls = _serve(monkeypatch, [_FakeResponse(200, text="a" * 40 + "\n")])
+    monkeypatch.setattr(pygr, "_ls_remote", lambda *a: {})
+    assert pygr._resolve_ref("https://github.com/u/tool.git", "v1.2") == "a" * 40
+    assert calls == ["https://api.github.com/repos/u/tool/commits/v1.2"]
+
+
+def test_resolve_ref_falls_back_to_ls_remote(monkeypatch):
+    pygr._resolve_ref.cache_clear()
+    monkeypatch.setattr(pygr, "_github_reset_at", 0.0)
+    monkeypatch.setattr(pygr, "_ls_remote", lambda url, ref="": {ref: "b" * 40})
+    limited = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(pygr.time.time() + 600)}
+    _serve(monkeypatch, [_FakeResponse(403, headers=limited)])
+    assert pygr._resolve_ref("https://github.com/u/tool.git", "main") == "b" * 40
+    # window now exhausted: the API is skipped without a request
+    pygr._resolve_ref.cache_clear()
+    calls = _serve(monkeypatch, [])
+    assert pygr._resolve_ref("https://github.com/u/tool.git", "main") == "b" * 40
+    assert pygr._resolve_ref("https://gitlab.com/u/tool.git", "main") == "b" * 40
+    assert calls == []
+
+
+def test_resolve_ref_is_cached(monkeypatch):
+    pygr._resolve_ref.cache_clear()
+    monkeypatch.setattr(pygr, "_resolve_ref_api", lambda *a: None)
+    calls = []
+    monkeypatch.setattr(
+        pygr, "_ls_remote", lambda url, ref="": calls.append(ref) or {ref: "c" * 40}
+    )
+    for _ in range(3):
+        assert pygr._resolve_ref("https://github.com/u/tool.git", "main") == "c" * 40
+    assert pygr._resolve_ref("https://github.com/u/tool.git", "d" * 40) == "d" * 40
+    assert calls == ["main"]
+    pygr._resolve_ref.cache_clear()
+
+
+def test_install_many_from_github_creates_one_generation(tmp_path, monkeypatch):
+    built = []
+
+    def build(owner, repo, ref, use_sandbox, store_root):
+        if repo == "broken":
+            raise RuntimeError("build failed")
+        path = tmp_path / f"{repo}id-{repo}-{ref}"
+        path.mkdir()
+        built.append(repo)
+        return "f" * 40, str(path), True
+
+    monkeypatch.setattr(pygr, "_build_from_github", build)
+    monkeypatch.setattr(pygr, "_resolve_ref", lambda url, ref: url + ref)
+    profile = pygr.Profile()
+    gen, _ = profile.current_generation()
+    sources = [("u/one", "HEAD"), ("u/two@v2", "HEAD"), ("u/one", "HEAD")]
+    ids = pygr.install_many_from_github(sources, use_sandbox=False)
+    assert ids == ["oneid", "twoid"]
+    assert sorted(built) == ["one", "two"]
+    new_gen, pkgs = profile.current_generation()
+    assert new_gen == gen + 1
+    assert {"oneid", "twoid"} <= set(pkgs)
+    assert pygr.Store().get_package_path("twoid") == str(tmp_path / "twoid-two-v2")
+    assert "github:u/one@" + "f" * 40 in pygr.DeclarativeConfig().read_specs()
+
+    with pytest.raises(RuntimeError, match="build failed"):
+        pygr.install_many_from_github([("u/broken", "HEAD"), ("u/three", "HEAD")])
+    assert "threeid" in profile.current_generation()[1]
+
+
+def test_install_many_from_github_dedupes_parsed_specs_and_repairs_rows(tmp_path, monkeypatch):
+    """Specs naming one commit build once; a store dir left without its row gets one."""
+    calls = []
+    commits = {"HEAD": "c" * 40, "main": "c" * 40, "v1": "d" * 40}
+
+    def build(owner, repo, ref, use_sandbox, store_root):
+        calls.append((owner, repo, ref))
+        path = tmp_path / f"{repo}id-{repo}-{ref}"
+        path.mkdir(exist_ok=True)
+        return "c" * 40, str(path), False  # as if an interrupted run had built it
+
+    monkeypatch.setattr(pygr, "_build_from_github", build)
+    monkeypatch.setattr(pygr, "_resolve_ref", lambda url, ref: url + commits[ref])
+    sources = [("u/x", "HEAD"), ("u/x@main", "HEAD"), ("u/y", "v1"), ("u/y@v1", "HEAD")]
+    assert pygr.install_many_from_github(sources, use_sandbox=False) == ["xid", "yid"]
+    assert sorted(calls) == [("u", "x", "HEAD"), ("u", "y", "v1")]
+    assert pygr.Store().get_package_path("yid") == str(tmp_path / "yid-y-v1")
+
+
+def test_github_get_cached_revalidates_and_honours_ttl(monkeypatch):
+    monkeypatch.setattr(pygr, "_github_reset_at", 0.0)
+    url = "https://api.github.com/repos/u/cached/commits/main"
+    headers = {"ETag": '"abc"'}
+    sent = []
+
+    def get(u, **kwargs):
+        sent.append(kwargs.get("headers", {}))
+        return responses.pop(0)
+
+    responses = [_FakeResponse(200, headers=headers, text="a" * 40), _FakeResponse(304)]
+    monkeypatch.setattr(pygr._github_session(), "get", get)
+    assert pygr._github_get_cached(url).text == "a" * 40
+    r = pygr._github_get_cached(url)
+    assert (r.status_code, r.text) == (200, "a" * 40)
+    assert sent[1]["If-None-Match"] == '"abc"'
+    # a fresh entry inside the ttl is answered without a request
+    assert pygr._github_get_cached(url, ttl=60).text == "a" * 40
+    assert len(sent) == 2
+
+
+def test_github_get_cached_is_keyed_by_authorization(monkeypatch):
+    """A response fetched with one token is never served to another token or to anonymous."""
+    monkeypatch.setattr(pygr, "_github_reset_at", 0.0)
+    url = "https://api.github.com/search/repositories"
+    sent = []
+
+    def get(u, **kwargs):
+        sent.append(kwargs.get("headers", {}).get("Authorization"))
+        return _FakeResponse(200, headers={"ETag": '"x"'}, text=f"result {len(sent)}")
+
+    monkeypatch.setattr(pygr._github_session(), "get", get)
+    private = {"Authorization": "Bearer secret"}
+    assert pygr._github_get_cached(url, ttl=60, headers=private).text == "result 1"
+    assert pygr._github_get_cached(url, ttl=60, headers=private).text == "result 1"
+    assert pygr._github_get_cached(url, ttl=60).text == "result 2"
+    other = {"Authorization": "Bearer other"}
+    assert pygr._github_get_cached(url, ttl=60, headers=other).text == "result 3"
+    assert sent == ["Bearer secret", None, "Bearer other"]
+
+
+def test_build_from_github_skips_fetch_when_installed(tmp_path, monkeypatch):
+    commit = "e" * 40
+    store_id = pygr.hashlib.sha256(f"github:u/tool@{commit}".encode()).hexdigest()[:16]
+    (tmp_path / f"{store_id}-tool-{commit}").mkdir()
+
+    def no_fetch(*a, **kw):
+        raise AssertionError("installed builds must not be fetched")
+
+    monkeypatch.setattr(pygr.SourceFetcher, "fetch_repo", no_fetch)
+    monkeypatch.setattr(pygr, "_resolve_ref_api", no_fetch)
+    result = pygr._build_from_github("u", "tool", commit, False, str(tmp_path))
+    assert result == (commit, str(tmp_path / f"{store_id}-tool-{commit}"), False)
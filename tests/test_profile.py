@@ -0,0 +1,38 @@
+"""Tests for Profile generations and bin symlinks."""
+
+import os
+
+import pygr  # noqa: E402
+
+
+def test_switch_to_generation_links_package_bins(tmp_path):
+    """Switching generations repoints the profile bin symlink at a dir of package links."""
+    store = pygr.Store()
+    pkg = tmp_path / "pkgstore" / "gen1-tool-1.0"
+    (pkg / "bin").mkdir(parents=True)
+    (pkg / "bin" / "tool").write_text("#!/bin/sh\n")
+    store.db.add_store_package("gen1", "tool", "1.0", str(pkg))
+    nobin = tmp_path / "pkgstore" / "gen2-lib-1.0"
+    nobin.mkdir()
+    store.db.add_store_package("gen2", "lib", "1.0", str(nobin))
+
+    profile = pygr.Profile("switch-test")
+    bin_dir = os.path.join(profile.dir, "bin")
+    os.makedirs(os.path.join(bin_dir, "stale-dir"))
+    open(os.path.join(bin_dir, "stale"), "w").close()
+    profile.add_generation(["gen1", "gen2", "missing"])
+    assert sorted(os.listdir(bin_dir)) == ["tool"]
+    assert os.readlink(os.path.join(bin_dir, "tool")) == str(pkg / "bin" / "tool")
+    assert os.path.islink(bin_dir)  # the legacy real bin dir was replaced
+    assert [n for n in os.listdir(profile.dir) if n.startswith(".")] == [os.readlink(bin_dir)]
+    current = os.path.join(pygr.PROFILE_DIR, "switch-test-current")
+    assert os.readlink(current) == os.path.join(profile.dir, "gen-1")
+
+    os.makedirs(os.path.join(profile.dir, ".old-interrupted", "stale"))
+    os.makedirs(os.path.join(profile.dir, ".bin-interrupted"))  # populated, never linked
+    os.symlink(".bin-interrupted", os.path.join(profile.dir, "bin.99999.tmp"))
+    profile.add_generation(["gen2"])
+    assert [n for n in os.listdir(profile.dir) if n.startswith(".")] == [os.readlink(bin_dir)]
+    assert "bin.99999.tmp" not in os.listdir(profile.dir)
+    assert os.listdir(bin_dir) == []
+    assert os.readlink(current) == os.path.join(profile.dir, "gen-2")
@@ -106,3 +106,104 @@ def test_find_recipes_in_dir(tmp_path):
     recipes = pygr.find_recipes_in_dir(str(tmp_path))
     names = {r.name for r in recipes}
     assert names == {"a", "b"}
+
+
+def test_find_recipes_in_dir_skips_broken_files(tmp_path):
+    """A recipe that fails to load is skipped without losing the others."""
+    (tmp_path / "sub").mkdir()
+    for name in ("a", "b", "c"):
+        (tmp_path / "sub" / f"{name}.yaml").write_text(
+            yaml.dump(
+                {
+                    "name": name,
+                    "version": "1",
+                    "source": {"type": "github", "repo": f"u/{name}", "ref": "main"},
+                }
+            )
+        )
+    (tmp_path / "broken.yaml").write_text("name: [unterminated\n")
+    (tmp_path / "invalid.yml").write_text(yaml.dump({"name": "x", "version": "1"}))
+    names = {r.name for r in pygr.find_recipes_in_dir(str(tmp_path))}
+    assert names == {"a", "b", "c"}
+
+
+def test_repo_manager_reuses_recipe_index(tmp_path, monkeypatch):
+    """Unchanged repos are served from the on-disk index; edited repos are re-parsed."""
+    import os
+
+    repos = tmp_path / "repos"
+    (repos / "main").mkdir(parents=True)
+    recipe_file = repos / "main" / "a.yaml"
+    recipe_file.write_text(
+        yaml.dump(
+            {
+                "name": "a",
+                "version": "1",
+                "source": {"type": "github", "repo": "u/a", "ref": "main"},
+            }
+        )
+    )
+    monkeypatch.setattr(pygr, "REPO_CACHE", str(repos))
+    monkeypatch.setattr(pygr, "RECIPE_INDEX", str(tmp_path / "index.json"))
+    mgr = pygr.RepoManager()
+    assert [r.version for r in mgr.list_recipes()] == ["1"]
+    assert (tmp_path / "index.json").is_file()
+
+    monkeypatch.setattr(pygr, "find_recipes_in_dir", lambda d: pytest.fail("re-parsed"))
+    assert [r.version for r in mgr.list_recipes()] == ["1"]
+
+    monkeypatch.undo()
+    monkeypatch.setattr(pygr, "REPO_CACHE", str(repos))
+    monkeypatch.setattr(pygr, "RECIPE_INDEX", str(tmp_path / "index.json"))
+    recipe_file.write_text(recipe_file.read_text().replace("version: '1'", "version: '2'"))
+    st = os.stat(recipe_file)
+    os.utime(recipe_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert [r.version for r in mgr.list_recipes()] == ["2"]
+
+
+def test_repo_manager_index_skips_values_json_cannot_hold(tmp_path, monkeypatch):
+    """A date-valued field (YAML's version: 2024-01-01) leaves no index or temp file behind."""
+    repos = tmp_path / "repos"
+    (repos / "main").mkdir(parents=True)
+    (repos / "main" / "a.yaml").write_text(
+        "name: a\nversion: 2024-01-01\nsource: {type: github, repo: u/a, ref: main}\n"
+    )
+    monkeypatch.setattr(pygr, "REPO_CACHE", str(repos))
+    monkeypatch.setattr(pygr, "RECIPE_INDEX", str(tmp_path / "index.json"))
+    recipes = pygr.RepoManager().list_recipes()
+    assert [r.name for r in recipes] == ["a"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["repos"]
+
+
+def test_load_recipe_file_cached_until_changed(tmp_path):
+    import os
+
+    recipe_file = tmp_path / "pkg.yaml"
+    data = {
+        "name": "foo",
+        "version": "1.0",
+        "source": {"type": "github", "repo": "u/foo", "ref": "v1"},
+    }
+    recipe_file.write_text(yaml.dump(data))
+    first = pygr.load_recipe_file(str(recipe_file))
+    assert pygr.load_recipe_file(str(recipe_file)) is first
+    data["version"] = "2.0"
+    recipe_file.write_text(yaml.dump(data))
+    os.utime(recipe_file, ns=(1, 1))
+    assert pygr.load_recipe_file(str(recipe_file)).version == "2.0"
+
+
+def test_recipe_paths_match_os_walk(tmp_path):
+    import os
+
+    for rel in ("a.yaml", "b.txt", "sub/c.yml", "sub/deep/d.yaml", "z/e.yaml"):
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text("")
+    os.symlink(tmp_path / "sub", tmp_path / "link")
+    expected = [
+        os.path.join(root, f)
+        for root, _, files in os.walk(tmp_path)
+        for f in files
+        if f.endswith((".yaml", ".yml"))
+    ]
+    assert pygr._recipe_paths(str(tmp_path)) == expected
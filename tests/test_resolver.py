@@ -92,3 +92,46 @@ def test_resolve_incompatible_dep_version_raises():
     r = pygr.Resolver(recipes)
     with pytest.raises(Exception, match="Incompatible"):
         r.resolve("app")
+
+
+def test_split_dep():
+    """Dependency specs split into name and constraint."""
+    assert pygr._split_dep("lib>=1.0") == ("lib", ">=1.0")
+    assert pygr._split_dep(" lib >= 1.0 ") == ("lib", ">= 1.0")
+    assert pygr._split_dep("foo-bar") == ("foo-bar", "")
+
+
+def test_resolve_memoizes_per_spec():
+    recipes = {"app": [_recipe("app", "1.0", ["lib"])], "lib": [_recipe("lib", "1.0")]}
+    r = pygr.Resolver(recipes)
+    first = r.resolve("app")
+    recipes["lib"] = []  # a repeated spec must not resolve again
+    assert r.resolve("app") == first
+    first.clear()
+    assert [x.name for x in r.resolve("app")] == ["lib", "app"]
+    with pytest.raises(Exception, match="No version of lib satisfies >=2.0"):
+        r.resolve("lib", ">=2.0")
+
+
+def test_resolve_deep_chain_without_recursion():
+    depth = 3000
+    recipes = {
+        f"p{i}": [_recipe(f"p{i}", "1.0", [f"p{i + 1}"] if i + 1 < depth else [])]
+        for i in range(depth)
+    }
+    order = pygr.Resolver(recipes).resolve("p0")
+    assert [x.name for x in order] == [f"p{i}" for i in reversed(range(depth))]
+
+
+def test_transaction_indexes_recipes_once(monkeypatch):
+    calls = []
+
+    def index(self):
+        calls.append(1)
+        return {"foo": [_recipe("foo", "1.0")]}
+
+    monkeypatch.setattr(pygr.RepoManager, "index_recipes_by_name", index)
+    trans = pygr.Transaction(use_sandbox=False)
+    assert trans.resolver is trans.resolver
+    assert trans.resolver.resolve("foo")[0].name == "foo"
+    assert calls == [1]
@@ -0,0 +1,111 @@
+"""Tests for SourceFetcher and git ref resolution."""
+
+import os
+import shutil
+
+import pygr  # noqa: E402
+
+LS_REMOTE = (
+    "1111111111111111111111111111111111111111\tHEAD\n"
+    "1111111111111111111111111111111111111111\trefs/heads/main\n"
+    "2222222222222222222222222222222222222222\trefs/heads/dev\n"
+    "3333333333333333333333333333333333333333\trefs/tags/v1.0\n"
+    "4444444444444444444444444444444444444444\trefs/tags/v1.0^{}\n"
+    "5555555555555555555555555555555555555555\trefs/tags/v0.9\n"
+)
+
+
+def test_parse_ls_remote_short_and_full_names():
+    """Refs resolve by short and full name."""
+    refs = pygr._parse_ls_remote(LS_REMOTE)
+    assert refs["HEAD"] == "1" * 40
+    assert refs["main"] == "1" * 40
+    assert refs["refs/heads/dev"] == "2" * 40
+    assert refs["v0.9"] == "5" * 40
+
+
+def test_parse_ls_remote_peels_annotated_tags():
+    """Annotated tags resolve to the commit, not the tag object."""
+    refs = pygr._parse_ls_remote(LS_REMOTE)
+    assert refs["v1.0"] == "4" * 40
+    assert refs["refs/tags/v1.0"] == "4" * 40
+
+
+def test_fetcher_uses_preresolved_refs(tmp_path, monkeypatch):
+    """fetch() resolution consults the preresolved ref cache without calling git."""
+    calls = []
+
+    def fake_ls_remote(url, ref=""):
+        calls.append((url, ref))
+        return pygr._parse_ls_remote(LS_REMOTE)
+
+    monkeypatch.setattr(pygr, "_ls_remote", fake_ls_remote)
+    fetcher = pygr.SourceFetcher(str(tmp_path))
+    recipes = [
+        pygr.Recipe(
+            {
+                "name": name,
+                "version": "1.0",
+                "source": {"type": "github", "repo": "u/mono", "ref": ref},
+            }
+        )
+        for name, ref in (("a", "main"), ("b", "dev"))
+    ]
+    fetcher.preresolve(recipes)
+    assert calls == [("https://github.com/u/mono.git", "")]
+    assert fetcher._resolve("https://github.com/u/mono.git", "dev") == "2" * 40
+    assert len(calls) == 1
+
+
+def test_fetch_cache_hit_reuses_recorded_tree_hash(tmp_path, monkeypatch):
+    """A cache hit without a sidecar gets the commit's git tree id (not a walk hash), once."""
+    lookups = []
+
+    def commit_tree_id(repo_url, commit, mirror_dir):
+        lookups.append((repo_url, commit))
+        return "f" * 40
+
+    monkeypatch.setattr(pygr, "_commit_tree_id", commit_tree_id)
+    fetcher = pygr.SourceFetcher(str(tmp_path))
+    sha = "1" * 40
+    cache_path = tmp_path / f"u_p_{sha}"
+    cache_path.mkdir()
+    (cache_path / "main.c").write_text("int main;")
+    recipe = pygr.Recipe(
+        {"name": "p", "version": "1", "source": {"type": "github", "repo": "u/p", "ref": sha}}
+    )
+    _, first = fetcher.fetch(recipe)
+    assert first == "f" * 40
+    assert (tmp_path / f"u_p_{sha}.treehash").read_text() == first
+    assert fetcher.fetch(recipe) == (str(cache_path), first)
+    assert lookups == [("https://github.com/u/p.git", sha)]
+
+
+def test_export_commit_uses_one_mirror_per_repo(tmp_path):
+    """Commits are fetched into a bare mirror once and exported without a .git dir."""
+    import git
+
+    origin = git.Repo.init(tmp_path / "origin")
+    commits = []
+    for text in ("one", "two"):
+        (tmp_path / "origin" / "a.txt").write_text(text)
+        origin.index.add(["a.txt"])
+        commits.append(origin.index.commit(text).hexsha)
+    origin_trees = [origin.git.rev_parse(f"{c}^{{tree}}") for c in commits]
+    origin.git.config("uploadpack.allowAnySHA1InWant", "true")
+    url = "file://" + str(tmp_path / "origin")
+    mirrors = tmp_path / "mirrors"
+
+    for commit, text in zip(commits, ("one", "two")):
+        dest = tmp_path / f"dest-{text}"
+        dest.mkdir()
+        tree = pygr._export_commit(url, commit, str(dest), str(mirrors))
+        assert tree == origin.git.rev_parse(f"{commit}^{{tree}}")
+        assert (dest / "a.txt").read_text() == text
+        assert not (dest / ".git").exists()
+    assert len(os.listdir(mirrors)) == 1
+    mirror = git.Repo(mirrors / os.listdir(mirrors)[0])
+    assert mirror.bare
+    shutil.rmtree(tmp_path / "origin")
+    pygr._mirror_fetch(mirror, commits[0])  # already present: the remote is not contacted
+    assert pygr._commit_tree_id(url, commits[0], str(mirrors)) == origin_trees[0]
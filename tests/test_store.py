@@ -1,5 +1,7 @@
 """Tests for Store and utility functions."""
 
+import pytest
+
 import pygr  # noqa: E402
 
 
@@ -35,3 +37,322 @@ def test_store_derivation_hash():
     assert h1 != h3
     h4 = store.compute_derivation_hash(r, "abc", ["dep1"])
     assert h1 != h4
+
+
+def test_store_add_package_moves_build_output(tmp_path):
+    """add_package renames the build output into the store instead of copying it."""
+    r = pygr.Recipe(
+        {
+            "name": "mv",
+            "version": "1.0",
+            "source": {"type": "github", "repo": "u/mv", "ref": "main"},
+        }
+    )
+    store = pygr.Store(str(tmp_path / "store"))
+    staged = tmp_path / "store" / ".stage-x"
+    (staged / "bin").mkdir(parents=True)
+    (staged / "bin" / "mv").write_text("#!/bin/sh\n")
+    path = store.add_package(r, "src", [], str(staged))
+    assert not staged.exists()
+    assert (tmp_path / "store" / path.split("/")[-1] / "bin" / "mv").is_file()
+    assert store.get_package_path(path.split("/")[-1].split("-")[0]) == path
+
+
+class _FakeRaw:
+    def __init__(self, body):
+        import io
+
+        self._buf = io.BytesIO(body)
+
+    def read(self, amt=-1, decode_content=True):
+        return self._buf.read(amt)
+
+
+class _FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.raw = _FakeRaw(body)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FakeCacheServer:
+    """Stands in for requests.get against a binary cache holding one tarball."""
+
+    def __init__(self, body, ranges=True, encoding=None):
+        self.body = body
+        self.ranges = ranges
+        self.encoding = encoding
+        self.range_requests = 0
+
+    def head(self, url, **kw):
+        raise AssertionError("fetch must not send a HEAD request")
+
+    def get(self, url, headers=None, **kw):
+        rng = (headers or {}).get("Range")
+        if not rng:
+            headers = {"Content-Length": str(len(self.body))}
+            if self.ranges:
+                headers["Accept-Ranges"] = "bytes"
+            if self.encoding:
+                headers["Content-Encoding"] = self.encoding
+            return _FakeResponse(200, self.body, headers=headers)
+        self.range_requests += 1
+        start, end = (int(x) for x in rng.split("=")[1].split("-"))
+        return _FakeResponse(206, self.body[start : end + 1])
+
+
+def _package_tarball(size=0):
+    import io
+    import os
+    import tarfile
+
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for name, data in (("pkg/bin/tool", b"#!/bin/sh\n"), ("pkg/share/blob", os.urandom(size))):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def test_binary_cache_streams_tarball_into_store(tmp_path, monkeypatch):
+    """BinaryCache.fetch extracts the downloaded tarball straight into store_path."""
+    server = _FakeCacheServer(_package_tarball(), ranges=False)
+    monkeypatch.setattr(pygr._http_session(), "head", server.head)
+    monkeypatch.setattr(pygr._http_session(), "get", server.get)
+    store_path = tmp_path / "abc-pkg-1.0"
+    assert pygr.BinaryCache("https://cache.example/").fetch("abc", str(store_path))
+    assert (store_path / "bin" / "tool").read_bytes() == b"#!/bin/sh\n"
+    assert [p.name for p in tmp_path.iterdir()] == ["abc-pkg-1.0"]
+
+
+def test_binary_cache_parallel_ranges(tmp_path, monkeypatch):
+    """Large tarballs are fetched as several range requests and reassembled in order."""
+    server = _FakeCacheServer(_package_tarball(size=50_000))
+    monkeypatch.setattr(pygr._http_session(), "head", server.head)
+    monkeypatch.setattr(pygr._http_session(), "get", server.get)
+    monkeypatch.setattr(pygr, "RANGE_DOWNLOAD_MIN", 1)
+    monkeypatch.setattr(pygr, "RANGE_CHUNK_SIZE", 4096)
+    store_path = tmp_path / "abc-pkg-1.0"
+    assert pygr.BinaryCache("https://cache.example/").fetch("abc", str(store_path))
+    assert server.range_requests == -(-len(server.body) // 4096)
+    assert (store_path / "bin" / "tool").read_bytes() == b"#!/bin/sh\n"
+    assert (store_path / "share" / "blob").stat().st_size == 50_000
+
+
+def test_extract_members_small_large_and_links(tmp_path, monkeypatch):
+    """Pool-written small files, inline large files, links and dir modes all land intact."""
+    import io
+    import os
+    import tarfile
+
+    def add(tar, name, data=None, **attrs):
+        info = tarfile.TarInfo(name)
+        for key, value in attrs.items():
+            setattr(info, key, value)
+        if data is not None:
+            info.size = len(data)
+        tar.addfile(info, io.BytesIO(data) if data is not None else None)
+
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        add(tar, "pkg/lib", type=tarfile.DIRTYPE, mode=0o750, mtime=1000)
+        for i in range(50):
+            add(tar, f"pkg/lib/m{i}.js", f"module {i}".encode(), mode=0o644)
+        add(tar, "pkg/bin/tool", b"#!/bin/sh\n", mode=0o755)
+        add(tar, "pkg/share/blob", b"x" * 5000)
+        add(tar, "pkg/bin/alias", type=tarfile.SYMTYPE, linkname="tool")
+        add(tar, "pkg/lib/copy.js", type=tarfile.LNKTYPE, linkname="pkg/lib/m0.js")
+    monkeypatch.setattr(pygr, "EXTRACT_SMALL_FILE", 1000)
+    buf.seek(0)
+    with tarfile.open(fileobj=buf, mode="r|gz") as tar:
+        pygr.BinaryCache._extract_members(tar, str(tmp_path))
+    pkg = tmp_path / "pkg"
+    assert all((pkg / "lib" / f"m{i}.js").read_text() == f"module {i}" for i in range(50))
+    assert (pkg / "bin" / "tool").stat().st_mode & 0o777 == 0o755
+    assert (pkg / "share" / "blob").stat().st_size == 5000
+    assert os.readlink(pkg / "bin" / "alias") == "tool"
+    assert (pkg / "lib" / "copy.js").read_text() == "module 0"
+    assert (pkg / "lib").stat().st_mtime == 1000
+
+
+@pytest.mark.parametrize("data_filter", [True, False])
+def test_extract_members_rejects_paths_outside_dest(tmp_path, monkeypatch, data_filter):
+    """Members that resolve outside dest ("..", absolute names, symlink parents) never escape.
+
+    Checked with tarfile's data filter and with the fallback for Pythons that lack it.
+    """
+    import io
+    import tarfile
+
+    if not data_filter:
+        monkeypatch.delattr(tarfile, "data_filter", raising=False)
+
+    def tarball(*members):
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+            for name, linkname in members:
+                info = tarfile.TarInfo(name)
+                if linkname:
+                    info.type, info.linkname = tarfile.SYMTYPE, linkname
+                    tar.addfile(info)
+                else:
+                    info.size = 4
+                    tar.addfile(info, io.BytesIO(b"evil"))
+        buf.seek(0)
+        return tarfile.open(fileobj=buf, mode="r|gz")
+
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    for members in (
+        [("../escaped.txt", None)],
+        [("pkg/out", "../../outside"), ("pkg/out/f.txt", None)],
+    ):
+        dest = tmp_path / "dest"
+        dest.mkdir()
+        with pytest.raises(tarfile.TarError), tarball(*members) as tar:
+            pygr.BinaryCache._extract_members(tar, str(dest))
+        pygr.shutil.rmtree(dest)
+    assert not (tmp_path / "escaped.txt").exists()
+    assert not (outside / "f.txt").exists()
+
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    with tarball((str(outside / "abs.txt"), None)) as tar:
+        pygr.BinaryCache._extract_members(tar, str(dest))
+    assert not (outside / "abs.txt").exists()
+    assert (dest / str(outside / "abs.txt").lstrip("/")).read_bytes() == b"evil"
+
+
+def test_binary_cache_streams_content_encoded_tarball(tmp_path, monkeypatch):
+    """With a Content-Encoding the single decoded stream is used, never raw ranges."""
+    server = _FakeCacheServer(_package_tarball(size=50_000), encoding="gzip")
+    monkeypatch.setattr(pygr._http_session(), "head", server.head)
+    monkeypatch.setattr(pygr._http_session(), "get", server.get)
+    monkeypatch.setattr(pygr, "RANGE_DOWNLOAD_MIN", 1)
+    store_path = tmp_path / "abc-pkg-1.0"
+    assert pygr.BinaryCache("https://cache.example/").fetch("abc", str(store_path))
+    assert server.range_requests == 0
+    assert (store_path / "share" / "blob").stat().st_size == 50_000
+
+
+def test_binary_cache_miss(tmp_path, monkeypatch):
+    """A 404 is a cache miss."""
+    monkeypatch.setattr(pygr._http_session(), "get", lambda url, **kw: _FakeResponse(404))
+    assert not pygr.BinaryCache("https://cache.example/").fetch("abc", str(tmp_path / "x"))
+
+
+def test_copy_tree_copies_contents(tmp_path):
+    """_copy_tree copies files, subdirs and symlinks into an existing destination."""
+    import os
+
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "sub" / "f.txt").write_text("data")
+    os.symlink("sub/f.txt", src / "link")
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    pygr._copy_tree(str(src), str(dst))
+    assert (dst / "sub" / "f.txt").read_text() == "data"
+    assert os.readlink(dst / "link") == "sub/f.txt"
+    (dst / "sub" / "f.txt").write_text("changed")
+    assert (src / "sub" / "f.txt").read_text() == "data"
+
+
+def test_store_derivation_hash_matches_compute_hash():
+    """The fast derivation hash equals compute_hash over the equivalent dict."""
+    r = pygr.Recipe(
+        {
+            "name": "pkg",
+            "version": "1.0",
+            "source": {"type": "github", "repo": "u/p", "ref": "main"},
+            "build": {"commands": ['make "X=1"']},
+            "dependencies": ["lib>=1"],
+        }
+    )
+    expected = pygr.compute_hash(
+        {"recipe": r.to_dict(), "source_hash": "abc", "dependencies": ["d1", "d2"]}
+    )
+    store = pygr.Store()
+    assert store.compute_derivation_hash(r, "abc", ["d2", "d1"]) == expected
+    assert store.compute_derivation_hash(r, "abc", ["d1", "d2"]) == expected
+
+
+def test_copy_file_preserves_content_and_mode(tmp_path):
+    """_copy_file copies bytes and permission bits."""
+    import os
+
+    src = tmp_path / "tool"
+    src.write_bytes(os.urandom(200_000))
+    src.chmod(0o755)
+    dst = tmp_path / "copy"
+    pygr._copy_file(str(src), str(dst))
+    assert dst.read_bytes() == src.read_bytes()
+    assert dst.stat().st_mode & 0o777 == 0o755
+
+
+def test_executables_lists_only_executable_files(tmp_path):
+    import os
+
+    (tmp_path / "tool").write_text("#!/bin/sh\n")
+    os.chmod(tmp_path / "tool", 0o755)
+    (tmp_path / "README").write_text("")
+    (tmp_path / "sub").mkdir(mode=0o755)
+    assert [e.name for e in pygr._executables(str(tmp_path))] == ["tool"]
+
+
+def test_adhoc_node_installs_dependencies_in_store(tmp_path, monkeypatch):
+    """npm runs in the store dir; the source tree's node_modules is never copied."""
+    import json
+
+    src, store = tmp_path / "src", tmp_path / "store"
+    (src / "lib").mkdir(parents=True)
+    (src / "lib" / "cli.js").write_text("console.log(1)")
+    (src / "node_modules" / "stale").mkdir(parents=True)
+    (src / "package.json").write_text(json.dumps({"name": "tool", "bin": {"tool": "lib/cli.js"}}))
+    (src / "package-lock.json").write_text("{}")
+    calls = []
+
+    def run_cmd(cmd, cwd=None, **kwargs):
+        calls.append((cmd, cwd))
+        (tmp_path / "store" / "node_modules" / "dep").mkdir(parents=True)
+
+    monkeypatch.setattr(pygr, "run_cmd", run_cmd)
+    pygr._adhoc_build_and_install(str(src), str(store), "tool", "v1", use_sandbox=False)
+    assert calls == [(["npm", "ci", "--omit=dev"], str(store))]
+    assert (store / "node_modules" / "dep").is_dir()
+    assert not (store / "node_modules" / "stale").exists()
+    assert (store / "bin" / "tool").read_text().endswith('exec node "$dir/../lib/cli.js" "$@"\n')
+
+
+def test_binary_cache_range_window_is_bounded(tmp_path, monkeypatch):
+    """Only RANGE_WINDOW chunks are requested ahead of what extraction has consumed."""
+    server = _FakeCacheServer(_package_tarball(size=50_000))
+    monkeypatch.setattr(pygr._http_session(), "head", server.head)
+    monkeypatch.setattr(pygr._http_session(), "get", server.get)
+    monkeypatch.setattr(pygr, "RANGE_CHUNK_SIZE", 512)
+    monkeypatch.setattr(pygr, "RANGE_WINDOW", 2)
+    chunks = pygr.BinaryCache._iter_ranges("https://cache.example/abc.tar.gz", len(server.body))
+    assert next(chunks) == server.body[:512]
+    assert server.range_requests <= 3
+    assert server.body[:512] + pygr._ChunkStream(chunks).read() == server.body
+
+
+def test_store_sweeps_stale_staging_dirs(tmp_path):
+    """Old .stage-*/.tmp-* dirs from a killed install are removed; fresh ones are kept."""
+    import os
+
+    root = tmp_path / "store"
+    for name in (".stage-old", ".tmp-old", ".stage-live", "abc-pkg-1.0"):
+        (root / name / "bin").mkdir(parents=True)
+    old = pygr.time.time() - pygr.STALE_TMP_AGE - 60
+    for name in (".stage-old", ".tmp-old", "abc-pkg-1.0"):
+        os.utime(root / name, (old, old))
+    pygr.Store(str(root))
+    assert sorted(os.listdir(root)) == [".stage-live", "abc-pkg-1.0"]
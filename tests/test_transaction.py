@@ -0,0 +1,250 @@
+"""Tests for Transaction fetch/build scheduling."""
+
+import os
+import threading
+
+import pygr  # noqa: E402
+
+
+def _recipe(name: str, version: str, deps=None, repo=None):
+    return pygr.Recipe(
+        {
+            "name": name,
+            "version": version,
+            "source": {"type": "github", "repo": repo or f"test/{name}", "ref": "main"},
+            "dependencies": deps or [],
+        }
+    )
+
+
+class _FakeFetcher:
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def fetch(self, recipe, force_refetch=False):
+        with self.lock:
+            self.calls.append(recipe.source["repo"])
+        src = self.tmp_path / "src" / recipe.source["repo"].replace("/", "_")
+        src.mkdir(parents=True, exist_ok=True)
+        return str(src), "srchash-" + recipe.source["repo"]
+
+
+class _FakeBuilder:
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.built = []
+        self.lock = threading.Lock()
+
+    def build(self, recipe, source_dir, dep_paths):
+        with self.lock:
+            self.built.append((recipe.name, list(dep_paths)))
+        out = self.tmp_path / "out" / recipe.name
+        (out / "bin").mkdir(parents=True, exist_ok=True)
+        (out / "bin" / recipe.name).write_text("#!/bin/sh\n")
+        return str(out)
+
+
+def _transaction(tmp_path):
+    trans = pygr.Transaction(use_sandbox=False)
+    trans.store.root = str(tmp_path / "store")
+    os.makedirs(trans.store.root)
+    trans.fetcher = _FakeFetcher(tmp_path)
+    trans.builder = _FakeBuilder(tmp_path)
+    return trans
+
+
+def test_realize_all_keeps_order_and_builds_deps_first(tmp_path):
+    """Store paths follow recipe order; each build sees its dependencies' store paths."""
+    recipes = [_recipe("lib", "1.0"), _recipe("tool", "1.0"), _recipe("app", "1.0", ["lib>=1.0"])]
+    trans = _transaction(tmp_path)
+    paths = trans._realize_all(recipes)
+    assert [os.path.basename(p).split("-", 1)[1] for p in paths] == [
+        "lib-1.0",
+        "tool-1.0",
+        "app-1.0",
+    ]
+    built = dict(trans.builder.built)
+    assert built["app"] == [paths[0]]
+    assert os.path.isfile(os.path.join(paths[2], "bin", "app"))
+
+
+def test_realize_all_raises_for_recipes_never_unblocked(tmp_path):
+    """Recipes stuck behind a dependency cycle fail the install instead of vanishing."""
+    import pytest
+
+    recipes = [_recipe("ok", "1.0"), _recipe("a", "1.0", ["b"]), _recipe("b", "2.0", ["a"])]
+    trans = _transaction(tmp_path)
+    with pytest.raises(Exception, match="Could not schedule a-1.0, b-2.0"):
+        trans._realize_all(recipes)
+
+
+def test_realize_all_shares_fetch_for_same_source(tmp_path):
+    """Recipes pinned to the same repo and ref are fetched once."""
+    recipes = [_recipe("a", "1.0", repo="test/mono"), _recipe("b", "1.0", repo="test/mono")]
+    trans = _transaction(tmp_path)
+    trans._realize_all(recipes)
+    assert trans.fetcher.calls == ["test/mono"]
+
+
+def test_realize_all_diamond(tmp_path):
+    """A dependency shared by several recipes is built once, before all of its dependents."""
+    recipes = [
+        _recipe("base", "1.0"),
+        _recipe("left", "1.0", ["base"]),
+        _recipe("right", "1.0", ["base>=1.0"]),
+        _recipe("top", "1.0", ["left", "right"]),
+    ]
+    trans = _transaction(tmp_path)
+    paths = trans._realize_all(recipes)
+    order = [name for name, _ in trans.builder.built]
+    assert order.count("base") == 1
+    assert order.index("base") < order.index("left") < order.index("top")
+    assert order.index("right") < order.index("top")
+    assert dict(trans.builder.built)["top"] == [paths[1], paths[2]]
+
+
+def test_realize_all_builds_independent_recipes_concurrently(tmp_path, monkeypatch):
+    """Siblings with no dependency between them are built at the same time."""
+    monkeypatch.setattr(pygr, "BUILD_WORKERS", 2)
+    barrier = threading.Barrier(2, timeout=5)
+    trans = _transaction(tmp_path)
+    build = trans.builder.build
+
+    def build_together(recipe, source_dir, dep_paths):
+        if recipe.name in ("left", "right"):
+            barrier.wait()  # raises BrokenBarrierError if the two builds were serialised
+        return build(recipe, source_dir, dep_paths)
+
+    trans.builder.build = build_together
+    recipes = [
+        _recipe("left", "1.0"),
+        _recipe("right", "1.0"),
+        _recipe("top", "1.0", ["left", "right"]),
+    ]
+    trans._realize_all(recipes)
+    assert [name for name, _ in trans.builder.built][-1] == "top"
+
+
+def test_cmd_install_batches_each_kind(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pygr, "_detect_distro", lambda: ("apt", ["true"], [], []))
+    monkeypatch.setattr(pygr, "distro_packages_available", lambda pm, names: {"jq", "bad"})
+    monkeypatch.setattr(
+        pygr, "distro_install_many", lambda pm, names: calls.append(("distro", names)) or ["jq"]
+    )
+
+    class _Config:
+        def add_entries(self, specs):
+            calls.append(("config", specs))
+
+    monkeypatch.setattr(pygr, "DeclarativeConfig", _Config)
+    recipes = {"bad": [_recipe("bad", "1.0")], "foo": [_recipe("foo", "1.0")]}
+    monkeypatch.setattr(pygr.RepoManager, "index_recipes_by_name", lambda self: recipes)
+    monkeypatch.setattr(
+        pygr.Transaction, "install", lambda self, specs: calls.append(("recipe", specs))
+    )
+    monkeypatch.setattr(pygr, "github_search", lambda name, per_page: [{"full_name": f"u/{name}"}])
+    monkeypatch.setattr(
+        pygr,
+        "install_many_from_github",
+        lambda sources, **kw: calls.append(("github", sources)),
+    )
+    pygr.cmd_install(["jq", "o/tool@v1", "bad", "foo>=2", "foo", "nope"], use_sandbox=False)
+    assert calls == [
+        ("distro", ["jq", "bad"]),
+        ("config", ["distro:apt:jq"]),
+        ("recipe", ["bad", "foo"]),
+        ("github", [("o/tool@v1", "HEAD"), ("u/foo>=2", "HEAD"), ("u/nope", "HEAD")]),
+    ]
+
+
+def test_cmd_install_continues_past_failed_github_search(monkeypatch):
+    """An unmatched or failing search is reported; every other spec still installs."""
+    import pytest
+
+    monkeypatch.setattr(pygr, "_detect_distro", lambda: None)
+    monkeypatch.setattr(pygr.RepoManager, "index_recipes_by_name", lambda self: {})
+
+    def search(name, per_page):
+        if name == "boom":
+            raise RuntimeError("rate limited")
+        return [] if name == "nothing" else [{"full_name": f"u/{name}"}]
+
+    monkeypatch.setattr(pygr, "github_search", search)
+    sources = []
+    monkeypatch.setattr(pygr, "install_many_from_github", lambda srcs, **kw: sources.extend(srcs))
+    with pytest.raises(SystemExit, match="nothing, boom"):
+        pygr.cmd_install(["o/tool", "nothing", "boom", "found"], use_sandbox=False)
+    assert sources == [("o/tool", "HEAD"), ("u/found", "HEAD")]
+
+
+def test_cmd_apply_skips_entries_the_last_apply_installed(tmp_path, monkeypatch):
+    conf = tmp_path / "packages.conf"
+    conf.write_text("distro:apt:jq\ngithub:o/tool@v1\n")
+    config = pygr.DeclarativeConfig
+    monkeypatch.setattr(pygr, "DeclarativeConfig", lambda: config(str(conf)))
+    monkeypatch.setattr(pygr, "APPLY_STATE", str(tmp_path / "last_apply.json"))
+    installs = []
+    monkeypatch.setattr(
+        pygr, "distro_install_many", lambda pm, names: installs.append(list(names)) or names
+    )
+    monkeypatch.setattr(
+        pygr,
+        "install_many_from_github",
+        lambda sources, **kw: installs.append([o for o, _ref in sources]),
+    )
+    pygr.cmd_apply(use_sandbox=False)
+    pygr.cmd_apply(use_sandbox=False)  # the github entry was applied; distro entries never skip
+    with open(conf, "a") as f:
+        f.write("github:o/new\n")
+    pygr.cmd_apply(use_sandbox=False)
+    pygr.cmd_apply(use_sandbox=False, full=True)
+    assert installs == [
+        ["jq"],
+        ["o/tool"],
+        ["jq"],
+        [],
+        ["jq"],
+        ["o/new"],
+        ["jq"],
+        ["o/tool", "o/new"],
+    ]
+
+
+def test_cmd_apply_reinstalls_distro_package_after_uninstall(tmp_path, monkeypatch):
+    """uninstall jq, re-add its line, apply: jq is installed again."""
+    conf = tmp_path / "packages.conf"
+    conf.write_text("distro:apt:jq\n")
+    config = pygr.DeclarativeConfig
+    monkeypatch.setattr(pygr, "DeclarativeConfig", lambda: config(str(conf)))
+    monkeypatch.setattr(pygr, "APPLY_STATE", str(tmp_path / "last_apply.json"))
+    installs = []
+    monkeypatch.setattr(
+        pygr, "distro_install_many", lambda pm, names: installs.append(list(names)) or names
+    )
+    monkeypatch.setattr(pygr, "distro_remove", lambda pm, name: True)
+    pygr.cmd_apply(use_sandbox=False)
+    pygr.Transaction(use_sandbox=False).uninstall(["jq"])
+    assert conf.read_text().strip() == ""
+    conf.write_text("distro:apt:jq\n")
+    pygr.cmd_apply(use_sandbox=False)
+    assert installs == [["jq"], ["jq"]]
+
+
+def test_transaction_context_batches_database_writes():
+    with pygr.Transaction(use_sandbox=False) as trans:
+        assert trans.store.db._batch_depth == 1
+    assert trans.store.db._batch_depth == 0
+
+
+def test_build_jobs_falls_back_to_cpu_count(monkeypatch, capsys):
+    """Bad PYGR_BUILD_JOBS values warn on stderr and use one job per CPU instead of failing."""
+    monkeypatch.setattr(pygr.os, "cpu_count", lambda: 6)
+    for raw, jobs in [("", 6), ("4 ", 4), ("auto", 6), ("0", 6), ("-2", 6)]:
+        monkeypatch.setenv("PYGR_BUILD_JOBS", raw)
+        assert pygr._build_jobs() == jobs, raw
+    out, err = capsys.readouterr()
+    assert out == ""
+    assert err.count("Ignoring PYGR_BUILD_JOBS") == 3
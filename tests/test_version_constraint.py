@@ -59,3 +59,13 @@ class TestVersionConstraint:
                 c.matches("1.0")
         except ImportError:
             pytest.skip("packaging.InvalidVersion not available")
+
+    def test_newest_index_agrees_with_linear_scan(self):
+        """newest_index's bisection picks the same version as scanning newest-first with matches."""
+        strs = ["0.9", "1.0", "1.0.0", "1.5", "2.0", "2.0.1", "3.0"]
+        versions = [pygr._parse_ver(v) for v in strs]
+        for spec in ["", "1.0", "== 2.0", "==4.0", ">= 1.5", "> 3.0", "<= 2.0", "< 1.0", "<0.1"]:
+            c = pygr.VersionConstraint(spec)
+            expected = next((i for i in reversed(range(len(strs))) if c.matches(strs[i])), None)
+            assert c.newest_index(versions) == expected, spec
+        assert pygr.VersionConstraint(">=1").newest_index([]) is None